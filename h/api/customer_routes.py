@@ -1,9 +1,12 @@
 # customer_routes.py - 顾客端API路由
-from flask import Blueprint, request, jsonify
-from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app
 import pymysql
 from models.database import get_db_connection
 from models.notification_model import NotificationModel
+from models.order_model import OrderModel
+from models import order_ingest
+from models.dish_model import DishModel, menu_cache
+from utils.idempotency import idempotent
 
 customer_bp = Blueprint('customer', __name__, url_prefix='/customer')
 
@@ -31,36 +34,28 @@ def create_session():
         }
     })
 
+def build_customer_menu_body():
+    """查询并序列化顾客端菜单（供菜单快照缓存回源）"""
+    dishes = DishModel.get_customer_menu()
+    payload = {
+        'success': True,
+        'data': {
+            'dishes': dishes
+        }
+    }
+    return current_app.json.dumps(payload).encode('utf-8')
+
 @customer_bp.route('/menu', methods=['GET'])
 def get_menu():
     """获取菜单（顾客端专用）"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        
-        # 只返回上架的菜品
-        cursor.execute('''
-            SELECT id, name, price, image_url, category, description, 
-                   rating, sales, is_available
-            FROM dishes 
-            WHERE is_available = 1
-            ORDER BY category, sales DESC
-        ''')
-        dishes = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'dishes': dishes
-            }
-        })
+        body = menu_cache.get_or_load(('customer', None), build_customer_menu_body)
+        return current_app.response_class(body, mimetype='application/json')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @customer_bp.route('/order', methods=['POST'])
+@idempotent
 def submit_order():
     """顾客提交订单"""
     data = request.get_json() or {}
@@ -74,55 +69,39 @@ def submit_order():
     if not items:
         return jsonify({'success': False, 'message': '订单不能为空'}), 400
     
+    order_items = [{
+        'dish_id': item.get('dishId'),
+        'quantity': item.get('quantity', 1),
+        'price': item.get('price', 0)
+    } for item in items]
+
+    if order_ingest.ingest_enabled():
+        queued = _enqueue_order(table_id, order_items, remark)
+        if queued is not None:
+            return queued
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        
-        # 计算订单总价
-        total_price = 0
-        for item in items:
-            dish_id = item.get('dishId')
-            quantity = item.get('quantity', 1)
-            price = item.get('price', 0)
-            total_price += price * quantity
-        
-        # 创建订单（顾客扫码点餐，无需登录）
-        cursor.execute('''
-            INSERT INTO orders (table_id, total_amount, status, remark, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-        ''', (table_id, total_price, 'pending', remark, datetime.now()))
-        
-        order_id = cursor.lastrowid
-        
-        # 创建订单项
-        for item in items:
-            dish_id = item.get('dishId')
-            quantity = item.get('quantity', 1)
-            price = item.get('price', 0)
-            
-            cursor.execute('''
-                INSERT INTO order_items (order_id, dish_id, quantity, price)
-                VALUES (%s, %s, %s, %s)
-            ''', (order_id, dish_id, quantity, price))
-            
-            # 更新菜品销量
-            cursor.execute('''
-                UPDATE dishes SET sales = sales + %s WHERE id = %s
-            ''', (quantity, dish_id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # 顾客扫码点餐，无需登录；与 App 结算共用订单写入逻辑
+        order = OrderModel.create_from_items(
+            user_id=None,
+            items=order_items,
+            table_id=table_id,
+            remark=remark,
+            status='pending'
+        )
+        if order is None:
+            return jsonify({'success': False, 'message': '订单不能为空'}), 400
+        order_id = order['order_id']
+        total_price = order['total_amount']
 
         # 创建通知给商家（假设商家用户ID为1，实际应根据店铺关联查询）
         try:
-            item_count = sum(item.get('quantity', 1) for item in items)
             NotificationModel.create_order_notification(
                 merchant_user_id=1,  # 商家用户ID
                 order_id=order_id,
                 table_id=table_id,
                 total_amount=total_price,
-                item_count=item_count
+                item_count=order['item_count']
             )
         except Exception as notify_error:
             # 通知创建失败不影响订单
@@ -142,6 +121,66 @@ def submit_order():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _enqueue_order(table_id, order_items, remark):
+    """高峰期下单：校验后放入写入队列，立即返回临时单号；写入线程未运行时返回 None 走同步下单"""
+    dish_index = DishModel.get_dish_index()
+    try:
+        for item in order_items:
+            item['quantity'] = int(item['quantity'])
+            item['price'] = float(item['price'])
+            if item['dish_id'] not in dish_index or item['quantity'] <= 0:
+                return jsonify({'success': False, 'message': f"菜品 {item['dish_id']} 无效"}), 400
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': '商品数量或价格无效'}), 400
+
+    try:
+        provisional_id = order_ingest.submit_order(
+            user_id=None,
+            items=order_items,
+            table_id=table_id,
+            remark=remark,
+            status='pending',
+            notify_user_id=1  # 商家用户ID
+        )
+    except order_ingest.QueueFullError:
+        response = jsonify({'success': False, 'message': '当前下单人数较多，请稍后重试'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(current_app.config.get('ORDER_INGEST_RETRY_AFTER', 2))
+        return response
+    if provisional_id is None:
+        return None
+
+    response = jsonify({
+        'success': True,
+        'data': {
+            'provisionalId': provisional_id,
+            'tableId': table_id,
+            'totalPrice': round(sum(i['price'] * i['quantity'] for i in order_items), 2),
+            'itemCount': len(order_items),
+            'status': 'queued',
+            'message': '订单已受理，正在提交'
+        }
+    })
+    response.status_code = 202
+    return response
+
+
+@customer_bp.route('/order/provisional/<provisional_id>', methods=['GET'])
+def get_provisional_order(provisional_id):
+    """查询高峰期受理订单的落库结果：queued / committed（附 orderId）/ failed"""
+    result = order_ingest.get_result(provisional_id)
+    if result is None:
+        return jsonify({'success': False, 'message': '临时单号不存在或已过期'}), 404
+    return jsonify({
+        'success': True,
+        'data': {
+            'provisionalId': provisional_id,
+            'status': result['status'],
+            'orderId': result.get('order_id'),
+            'message': result.get('error', '')
+        }
+    })
+
 @customer_bp.route('/order/<int:order_id>/status', methods=['GET'])
 def get_order_status(order_id):
     """获取订单状态"""
@@ -5,6 +5,7 @@ import os
 import time
 import uuid
 from copy import deepcopy
+from datetime import date, timedelta
 from typing import Dict, List
 from werkzeug.utils import secure_filename
 
@@ -12,17 +13,20 @@ from flask import Blueprint, request, current_app
 
 from utils.response_utils import error_response, success_response
 from utils.jwt_utils import login_required, decode_token
+from utils.http_cache import conditional_get
+from utils.idempotency import idempotent
 from models.user_model import UserModel
 from models.order_model import OrderModel
 from models.message_model import MessageModel
 from models.table_model import TableModel
 from models.follow_model import FollowModel
 from models.notification_model import NotificationModel
-from models.dish_model import DishModel
+from models.dish_model import DishModel, menu_cache
 from models.post_model import PostModel
 from models.comment_model import CommentModel
 from models.shop_model import ShopModel
 from models.cart_model import CartModel
+from models.sales_model import SalesModel, SALES_STATUSES, GROUP_BY_OPTIONS
 
 data_bp = Blueprint("data", __name__)
 
@@ -46,44 +50,6 @@ shop_info = {
 }
 
 
-dish_id_counter = itertools.count(start=101)
-dishes: List[Dict] = [
-    {
-        "id": 1,
-        "name": "招牌番茄牛腩",
-        "description": "慢炖牛腩配以新鲜番茄，汤汁浓郁。",
-        "price": 38.0,
-        "image_url": "",
-        "category": "热菜",
-        "is_recommended": True,
-        "sales": 126,
-        "status": "available",
-    },
-    {
-        "id": 2,
-        "name": "香辣小龙虾",
-        "description": "精选麻辣口味，香辣过瘾。",
-        "price": 58.0,
-        "image_url": "",
-        "category": "特色",
-        "is_recommended": True,
-        "sales": 203,
-        "status": "available",
-    },
-    {
-        "id": 3,
-        "name": "清炒时蔬",
-        "description": "每日新鲜蔬菜，清爽不油腻。",
-        "price": 18.0,
-        "image_url": "",
-        "category": "素菜",
-        "is_recommended": False,
-        "sales": 87,
-        "status": "available",
-    },
-]
-
-
 cart: Dict = {
     "items": [],
     "total_quantity": 0,
@@ -219,6 +185,7 @@ def calculate_cart_totals():
 
 
 @data_bp.route("/shops/info", methods=["GET"])
+@conditional_get(resource="shop", cache_control="public, no-cache")
 def get_shop_info():
     try:
         shop_info = ShopModel.get_info(1)
@@ -227,30 +194,38 @@ def get_shop_info():
         return error_response(f"获取店铺信息失败: {str(e)}", 500)
 
 
+def build_dish_list_body(shop_id):
+    """查询并序列化菜单响应体（供菜单快照缓存回源）"""
+    dishes_data = DishModel.get_all(shop_id)
+
+    # 格式化菜品数据
+    formatted_dishes = []
+    for dish in dishes_data:
+        formatted_dish = {
+            "id": dish["id"],
+            "name": dish["name"],
+            "description": dish.get("description", ""),
+            "price": float(dish["price"]),
+            "image_url": dish.get("image_url", ""),
+            "category": dish.get("category", ""),
+            "is_recommended": bool(dish.get("is_recommended", False)),
+            "sales": dish.get("sales", 0),
+            "status": dish.get("status", "available")
+        }
+        formatted_dishes.append(formatted_dish)
+
+    payload = success_response("获取菜品成功", {"dishes": formatted_dishes})
+    return current_app.json.dumps(payload).encode("utf-8")
+
+
 @data_bp.route("/dishes/list", methods=["GET"])
 @data_bp.route("/dishes", methods=["GET"])
+@conditional_get(cache_control="public, max-age=30")
 def get_dish_list():
     try:
         shop_id = request.args.get("shop_id", 1, type=int)
-        dishes_data = DishModel.get_all(shop_id)
-        
-        # 格式化菜品数据
-        formatted_dishes = []
-        for dish in dishes_data:
-            formatted_dish = {
-                "id": dish["id"],
-                "name": dish["name"],
-                "description": dish.get("description", ""),
-                "price": float(dish["price"]),
-                "image_url": dish.get("image_url", ""),
-                "category": dish.get("category", ""),
-                "is_recommended": bool(dish.get("is_recommended", False)),
-                "sales": dish.get("sales", 0),
-                "status": dish.get("status", "available")
-            }
-            formatted_dishes.append(formatted_dish)
-        
-        return success_response("获取菜品成功", {"dishes": formatted_dishes})
+        body = menu_cache.get_or_load(("dishes", shop_id), lambda: build_dish_list_body(shop_id))
+        return current_app.response_class(body, mimetype="application/json")
     except Exception as e:
         return error_response(f"获取菜品失败: {str(e)}", 500)
 
@@ -454,11 +429,17 @@ def add_to_cart(_jwt_claims=None):
             return error_response("用户未登录", 401)
         
         data = request.get_json(silent=True) or {}
-        dish_id = data.get("dish_id")
-        quantity = int(data.get("quantity", 1))
-
-        if dish_id is None:
+        if data.get("dish_id") is None:
             return error_response("缺少菜品ID", 400)
+        # 与 /cart/batch 一致统一转为整数，数据库与内存两种购物车实现行为相同
+        try:
+            dish_id = int(data.get("dish_id"))
+            quantity = int(data.get("quantity", 1))
+        except (TypeError, ValueError):
+            return error_response("菜品ID或商品数量无效", 400)
+
+        if quantity <= 0:
+            return error_response("商品数量必须大于0", 400)
 
         cart_data = CartModel.add_item(user_id, dish_id, quantity)
         if cart_data is None:
@@ -481,11 +462,13 @@ def update_cart_item(_jwt_claims=None):
             return error_response("用户未登录", 401)
         
         data = request.get_json(silent=True) or {}
-        dish_id = data.get("dish_id")
-        quantity = int(data.get("quantity", 1))
-
-        if dish_id is None:
+        if data.get("dish_id") is None:
             return error_response("缺少菜品ID", 400)
+        try:
+            dish_id = int(data.get("dish_id"))
+            quantity = int(data.get("quantity", 1))
+        except (TypeError, ValueError):
+            return error_response("菜品ID或商品数量无效", 400)
 
         cart_data = CartModel.update_item(user_id, dish_id, quantity)
         return success_response("更新购物车成功", cart_data)
@@ -493,6 +476,27 @@ def update_cart_item(_jwt_claims=None):
         return error_response(f"更新购物车失败: {str(e)}", 500)
 
 
+@data_bp.route("/cart/batch", methods=["POST"])
+@login_required
+def batch_update_cart(_jwt_claims=None):
+    """批量修改购物车：客户端合并连续的加减操作后一次提交
+
+    请求体：{"ops": [{"op": "set"|"increment"|"remove", "dish_id": 1, "quantity": 2}, ...]}
+    """
+    try:
+        user_id = _jwt_claims.get('uid') if _jwt_claims else None
+        if not user_id:
+            return error_response("用户未登录", 401)
+
+        data = request.get_json(silent=True) or {}
+        cart_data = CartModel.apply_ops(user_id, data.get("ops"))
+        return success_response("更新购物车成功", cart_data)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        return error_response(f"更新购物车失败: {str(e)}", 500)
+
+
 @data_bp.route("/cart/clear", methods=["POST"])
 @login_required
 def clear_cart(_jwt_claims=None):
@@ -512,6 +516,7 @@ def clear_cart(_jwt_claims=None):
 
 @data_bp.route("/orders/create", methods=["POST"])
 @login_required
+@idempotent
 def create_order(_jwt_claims=None):
     """
     结算购物车并创建订单（默认标记为已支付）
@@ -594,6 +599,7 @@ def pay_order(_jwt_claims=None):
 
 
 @data_bp.route("/orders", methods=["POST"])
+@idempotent
 def create_h5_order():
     """H5网页下单接口"""
     try:
@@ -608,46 +614,63 @@ def create_h5_order():
         if not items:
             return error_response("请选择菜品", 400)
 
-        # 计算总价
-        total_amount = 0
-        total_quantity = 0
+        # 按菜单缓存中的菜品定价（一次取出整个菜品索引），忽略不存在或已下架的菜品
+        dish_index = DishModel.get_dish_index()
         order_items = []
-
         for item in items:
-            dish_id = item.get("dish_id")
-            quantity = item.get("quantity", 1)
-
-            # 查找菜品
-            dish = next((d for d in dishes if d["id"] == dish_id), None)
-            if dish:
-                item_total = dish["price"] * quantity
-                total_amount += item_total
-                total_quantity += quantity
-                order_items.append({
-                    "dish_id": dish_id,
-                    "dish_name": dish["name"],
-                    "price": dish["price"],
-                    "quantity": quantity,
-                    "subtotal": item_total
-                })
+            try:
+                dish_id = int(item.get("dish_id"))
+                quantity = int(item.get("quantity", 1))
+            except (TypeError, ValueError):
+                return error_response("菜品ID或商品数量无效", 400)
+            if quantity <= 0:
+                return error_response("商品数量必须大于0", 400)
+            dish = dish_index.get(dish_id)
+            if not dish or dish.get("status") != "available":
+                continue
+            order_items.append({
+                "dish_id": dish["id"],
+                "dish_name": dish["name"],
+                "price": dish["price"],
+                "quantity": quantity,
+                "subtotal": round(dish["price"] * quantity, 2)
+            })
+
+        if not order_items:
+            return error_response("请选择菜品", 400)
 
-        # 创建订单
-        order_id = int(time.time() * 1000)
-        order = {
-            "order_id": order_id,
+        # 与 App 下单共用订单写入逻辑
+        order = OrderModel.create_from_items(
+            user_id=None,
+            items=order_items,
+            table_id=table_number or None,
+            remark=data.get("remark", ""),
+            status="pending"
+        )
+        if not order:
+            return error_response("请选择菜品", 400)
+
+        try:
+            NotificationModel.create_order_notification(
+                merchant_user_id=1,
+                order_id=order["order_id"],
+                table_id=table_number,
+                total_amount=order["total_amount"],
+                item_count=order["item_count"]
+            )
+        except Exception as notify_error:
+            current_app.logger.warning(f"创建订单通知失败: {notify_error}")
+
+        return success_response("下单成功", {
+            "order_id": order["order_id"],
             "table_number": table_number,
             "items": order_items,
-            "total_amount": total_amount,
-            "total_quantity": total_quantity,
+            "total_amount": order["total_amount"],
+            "total_quantity": order["item_count"],
             "source": source,
-            "status": "pending",
+            "status": order["status"],
             "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
-        }
-
-        # TODO: 保存到数据库
-        # OrderModel.create(order)
-
-        return success_response("下单成功", order)
+        })
     except Exception as e:
         return error_response(f"下单失败: {str(e)}", 500)
 
@@ -665,6 +688,46 @@ def get_sales_stats(_jwt_claims=None):
     except Exception as e:
         return error_response(f"获取销售统计失败: {str(e)}", 500)
 
+# 未指定开始日期时各粒度默认查询的天数
+TIMESERIES_DEFAULT_DAYS = {"hour": 1, "day": 30, "week": 84}
+
+
+@data_bp.route("/sales/timeseries", methods=["GET"])
+@login_required
+@conditional_get(resource="shop", cache_control="private, no-cache", vary="Authorization")
+def get_sales_timeseries(_jwt_claims=None):
+    """按小时/天/周分桶的销售额序列，可按菜品或分类拆分"""
+    try:
+        bucket = request.args.get("bucket", "day")
+        if bucket not in TIMESERIES_DEFAULT_DAYS:
+            return error_response("bucket 只能是 hour/day/week", 400)
+        group_by = request.args.get("group_by", "total")
+        if group_by not in GROUP_BY_OPTIONS:
+            return error_response("group_by 只能是 total/dish/category", 400)
+
+        try:
+            end = date.fromisoformat(request.args["end"]) if request.args.get("end") else date.today()
+            start = (date.fromisoformat(request.args["start"]) if request.args.get("start")
+                     else end - timedelta(days=TIMESERIES_DEFAULT_DAYS[bucket] - 1))
+        except ValueError:
+            return error_response("日期格式应为 YYYY-MM-DD", 400)
+        if start > end:
+            return error_response("开始日期不能晚于结束日期", 400)
+        max_days = (current_app.config.get("SALES_HOURLY_MAX_DAYS", 31) if bucket == "hour"
+                    else current_app.config.get("SALES_TIMESERIES_MAX_DAYS", 731))
+        if (end - start).days + 1 > max_days:
+            return error_response(f"查询跨度不能超过 {max_days} 天", 400)
+
+        statuses = tuple(s for s in request.args.get("status", "").split(",") if s) or SALES_STATUSES
+        shop_id = request.args.get("shop_id", 1, type=int)
+        limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+
+        result = SalesModel.get_timeseries(shop_id, start, end, bucket=bucket, group_by=group_by,
+                                           statuses=statuses, limit=limit)
+        return success_response("获取成功", result)
+    except Exception as e:
+        return error_response(f"获取销售趋势失败: {str(e)}", 500)
+
 @data_bp.route("/orders/list", methods=["GET"])
 @login_required
 def get_user_orders(_jwt_claims=None):
@@ -686,11 +749,32 @@ def get_user_orders(_jwt_claims=None):
 # -----------------------------
 
 
+def build_pagination(result):
+    """帖子列表分页信息：游标模式返回 next_cursor，页码模式返回总数"""
+    if 'next_cursor' in result:
+        return {
+            "limit": result['limit'],
+            "next_cursor": result['next_cursor'],
+            "has_more": result['has_more'],
+            # 推荐流的游标失效后从第一页重新开始，客户端需清空已加载的帖子
+            "reset": result.get('reset', False)
+        }
+    return {
+        "page": result['page'],
+        "limit": result['limit'],
+        "total": result['total'],
+        "pages": result['pages']
+    }
+
+
 @data_bp.route("/posts/list", methods=["GET"])
+@conditional_get(cache_control="private, no-cache", vary="Authorization")
 def get_posts():
     try:
         page = int(request.args.get("page", 1))
         limit = int(request.args.get("limit", 10))
+        # 携带 cursor 参数（可为空）时使用游标分页
+        page_cursor = request.args.get("cursor")
         category_raw = request.args.get("category", "recommend")
         
         # 支持英文和中文参数
@@ -709,23 +793,23 @@ def get_posts():
         payload = decode_token(token)
         current_user_id = payload.get('uid') if payload else None
 
-        # 获取关注用户ID列表（如果是"关注"分类）
-        following_ids = None
-        if category == "关注":
-            if current_user_id:
-                following_ids = FollowModel.get_following_ids(current_user_id)
-            else:
-                # 未登录时返回空列表
-                following_ids = []
-
         # 从数据库获取帖子
-        result = PostModel.get_list(
-            page=page,
-            limit=limit,
-            category=category,
-            current_user_id=current_user_id,
-            following_ids=following_ids
-        )
+        if category == "关注" and current_user_id:
+            # 读取写扩散生成的个人时间线
+            result = PostModel.get_following_feed(current_user_id, page, limit, page_cursor)
+        elif category == "推荐":
+            # 按后台计算的热度榜翻页
+            result = PostModel.get_recommend_feed(page, limit, current_user_id, page_cursor)
+        else:
+            # 未登录时"关注"分类返回空列表
+            result = PostModel.get_list(
+                page=page,
+                limit=limit,
+                category=category,
+                current_user_id=current_user_id,
+                following_ids=[] if category == "关注" else None,
+                page_cursor=page_cursor
+            )
 
         # 添加关注状态
         if current_user_id and result['posts']:
@@ -739,13 +823,10 @@ def get_posts():
 
         return success_response("获取帖子成功", {
             "posts": result['posts'],
-            "pagination": {
-                "page": result['page'],
-                "limit": result['limit'],
-                "total": result['total'],
-                "pages": result['pages']
-            }
+            "pagination": build_pagination(result)
         })
+    except ValueError as e:
+        return error_response(f"参数错误: {str(e)}", 400)
     except Exception as e:
         return error_response(f"获取帖子失败: {str(e)}", 500)
 
@@ -815,18 +896,16 @@ def get_user_posts(user_id):
     try:
         page = int(request.args.get("page", 1))
         limit = int(request.args.get("limit", 10))
+        page_cursor = request.args.get("cursor")
 
-        result = PostModel.get_by_user_id(user_id, page, limit)
+        result = PostModel.get_by_user_id(user_id, page, limit, page_cursor)
 
         return success_response("获取用户帖子成功", {
             "posts": result['posts'],
-            "pagination": {
-                "page": result['page'],
-                "limit": result['limit'],
-                "total": result['total'],
-                "pages": result['pages']
-            }
+            "pagination": build_pagination(result)
         })
+    except ValueError as e:
+        return error_response(f"参数错误: {str(e)}", 400)
     except Exception as e:
         return error_response(f"获取用户帖子失败: {str(e)}", 500)
 
@@ -973,10 +1052,33 @@ def get_messages(_jwt_claims=None):
         return error_response("用户未登录", 401)
 
     try:
-        messages_list = MessageModel.get_messages(conversation_id, current_user_id)
-        # 标记消息为已读
-        MessageModel.mark_messages_read(conversation_id, current_user_id)
-        return success_response("获取消息成功", {"messages": messages_list})
+        before_id = request.args.get("before_id")
+        after_id = request.args.get("after_id")
+        limit = int(request.args.get("limit", 50))
+        before_id = int(before_id) if before_id else None
+        after_id = int(after_id) if after_id else None
+    except ValueError:
+        return error_response("分页参数无效", 400)
+
+    try:
+        result = MessageModel.get_messages(
+            conversation_id, current_user_id,
+            before_id=before_id, after_id=after_id, limit=limit
+        )
+        # 翻看历史消息不影响未读状态，只在加载最新消息时标记已读
+        if before_id is None:
+            MessageModel.mark_messages_read(conversation_id, current_user_id)
+        messages_list = result['messages']
+        return success_response("获取消息成功", {
+            "messages": messages_list,
+            "pagination": {
+                "limit": result['limit'],
+                "has_more": result['has_more'],
+                # 向上翻页用最早一条的 id 作为 before_id，增量拉取用最新一条的 id 作为 after_id
+                "before_id": messages_list[0]['id'] if messages_list else before_id,
+                "after_id": messages_list[-1]['id'] if messages_list else after_id
+            }
+        })
     except Exception as e:
         # 回退到内存数据
         messages = deepcopy(conversation_messages.get(conversation_id, []))
@@ -1015,10 +1117,9 @@ def send_message(_jwt_claims=None):
             video_url=data.get("video_url")
         )
 
-        # 创建消息通知给接收者
+        # 创建消息通知给接收者（异步写入，不占用本次请求）
         try:
-            participant = MessageModel.get_conversation_participant(conversation_id, current_user_id)
-            if participant and participant.get('receiver_id'):
+            if message.get('receiverId'):
                 display_content = content
                 if msg_type == 'image':
                     display_content = '[图片]'
@@ -1028,7 +1129,7 @@ def send_message(_jwt_claims=None):
                     display_content = '[语音]'
 
                 NotificationModel.create_message_notification(
-                    receiver_id=participant['receiver_id'],
+                    receiver_id=message['receiverId'],
                     sender_name=current_username,
                     message_content=display_content,
                     conversation_id=conversation_id,
@@ -1261,6 +1362,7 @@ def add_dish_review(dish_id: int, _jwt_claims=None):
 
 @data_bp.route("/tables", methods=["GET"])
 @login_required
+@conditional_get(resource="tables", cache_control="private, no-cache")
 def get_tables(_jwt_claims=None):
     """获取所有桌位"""
     try:
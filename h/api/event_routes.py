@@ -0,0 +1,108 @@
+# event_routes.py - 实时推送（Server-Sent Events）
+import math
+
+import jwt
+from flask import Blueprint, current_app, jsonify, request
+
+from utils.jwt_utils import decode_token
+from utils.pubsub import hub, shop_orders_channel, user_channel
+from utils.response_utils import error_response, success_response
+from utils.sse import stream_subscription
+
+events_bp = Blueprint('events', __name__)
+
+
+def _stream_claims():
+    """EventSource 无法设置请求头，允许通过 ?token= 传递令牌"""
+    auth_header = request.headers.get('Authorization', '')
+    token = auth_header[7:].strip() if auth_header.startswith('Bearer ') else request.args.get('token', '')
+    if not token:
+        return None, '缺少或无效的认证头'
+    try:
+        return decode_token(token), None
+    except jwt.ExpiredSignatureError:
+        return None, '登录已过期'
+    except jwt.InvalidTokenError:
+        return None, '无效的令牌'
+
+
+def open_stream(channel):
+    """订阅频道并返回 SSE 响应，支持 Last-Event-ID 断线续传"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription, backlog, reset = hub.subscribe(channel, last_event_id)
+    return stream_subscription(
+        subscription, backlog, reset,
+        heartbeat=current_app.config.get('SSE_HEARTBEAT_INTERVAL', 15),
+        max_duration=current_app.config.get('SSE_MAX_DURATION', 300)
+    )
+
+
+def _current_user_id():
+    claims, error = _stream_claims()
+    if error:
+        return None, (jsonify({'code': 401, 'message': error, 'data': None}), 401)
+    user_id = claims.get('uid')
+    if not user_id:
+        return None, (jsonify({'code': 401, 'message': '用户未登录', 'data': None}), 401)
+    return user_id, None
+
+
+@events_bp.route('/events/stream', methods=['GET'])
+def user_event_stream():
+    """当前用户的实时事件流：新消息（message）、新通知（notification）"""
+    user_id, error = _current_user_id()
+    if error:
+        return error
+    return open_stream(user_channel(user_id))
+
+
+@events_bp.route('/orders/stream', methods=['GET'])
+def order_event_stream():
+    """店铺订单实时流（后厨/商家端）：新订单（order_created）、状态变更（order_status）"""
+    _, error = _current_user_id()
+    if error:
+        return error
+    shop_id = request.args.get('shop_id', 1, type=int)
+    return open_stream(shop_orders_channel(shop_id))
+
+
+@events_bp.route('/orders/poll', methods=['GET'])
+def order_event_poll():
+    """订单长轮询：不支持 SSE 的客户端使用
+
+    携带上次返回的 cursor 续传；期间没有新事件时最多挂起 timeout 秒。
+    reset 为 true 表示 cursor 已过期，需要重新拉取一次订单列表。
+    """
+    _, error = _current_user_id()
+    if error:
+        return error
+    shop_id = request.args.get('shop_id', 1, type=int)
+    channel = shop_orders_channel(shop_id)
+    # 首次请求没有游标时从当前最新事件（空频道为起点游标）之后开始，保证两次轮询之间的事件不丢
+    since = request.args.get('cursor') or hub.last_event_id(channel)
+    max_timeout = current_app.config.get('ORDER_LONGPOLL_TIMEOUT', 25)
+    try:
+        timeout = float(request.args.get('timeout', max_timeout))
+    except ValueError:
+        return error_response("timeout 参数无效", 400)
+    if not math.isfinite(timeout) or timeout < 0:
+        return error_response("timeout 参数无效", 400)
+    timeout = min(timeout, max_timeout)
+
+    subscription, events, reset = hub.subscribe(channel, since)
+    try:
+        if not events and not reset:
+            events = subscription.get(timeout)
+            reset = subscription.overflowed
+    finally:
+        subscription.close()
+
+    if events:
+        since = events[-1]['id']
+    elif reset:
+        since = hub.last_event_id(channel)
+    return success_response("获取成功", {
+        "events": [{"id": e['id'], "event": e['event'], "data": e['data']} for e in events],
+        "cursor": since,
+        "reset": reset
+    })
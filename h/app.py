@@ -29,18 +29,61 @@ def create_app(config_name):
     from api.data_routes import data_bp
     from api.customer_routes import customer_bp
     from api.payment_routes import payment_bp
+    from api.event_routes import events_bp
 
     app.register_blueprint(user_bp, url_prefix='/api')
     app.register_blueprint(auth_bp, url_prefix='/api')
     app.register_blueprint(data_bp, url_prefix='/api')
     app.register_blueprint(customer_bp, url_prefix='/api')
     app.register_blueprint(payment_bp, url_prefix='/api/payment')
+    app.register_blueprint(events_bp, url_prefix='/api')
+
+    # 预热数据库连接池，并启用请求级数据库会话
+    from models.database import get_pool, get_pool_stats, init_db_session
+    init_db_session(app)
+    try:
+        get_pool().warm_up()
+    except Exception as e:
+        app.logger.warning(f'数据库连接池预热失败: {e}')
 
     # 初始化桌位表
     from models.table_model import TableModel
     with app.app_context():
         TableModel.init_table()
 
+    # 后台任务
+    from utils.scheduler import scheduler, should_run_jobs
+    from models.database import job_lock
+    from models.dish_model import DishModel
+    from models.post_model import PostModel
+    from models.notification_model import NotificationModel, notification_queue
+    from utils.idempotency import purge_expired_keys
+    from models.sales_model import SalesModel
+    scheduler.add_job('rank_hot_posts', PostModel.refresh_hot_ranking,
+                      app.config.get('FEED_RANK_INTERVAL', 300), initial_delay=0)
+    if app.config.get('NOTIFICATION_OUTBOX_ENABLED'):
+        scheduler.add_job('relay_notification_outbox', NotificationModel.relay_outbox,
+                          app.config.get('NOTIFICATION_OUTBOX_INTERVAL', 1))
+    if app.config.get('CART_BACKEND') == 'memory':
+        from models.cart_store import cart_store
+        scheduler.add_job('flush_carts', cart_store.flush, app.config.get('CART_FLUSH_INTERVAL', 5))
+    # 全表任务：多 worker 之间用命名锁互斥，见 SINGLETON_JOBS_ENABLED
+    if app.config.get('SINGLETON_JOBS_ENABLED', True):
+        scheduler.add_job('reconcile_dish_sales', DishModel.reconcile_sales,
+                          app.config.get('DISH_SALES_RECONCILE_INTERVAL', 3600), lock=job_lock)
+        scheduler.add_job('reconcile_unread_counts', NotificationModel.reconcile_unread_counts,
+                          app.config.get('NOTIFICATION_COUNTER_RECONCILE_INTERVAL', 3600), lock=job_lock)
+        scheduler.add_job('notification_retention', NotificationModel.apply_retention,
+                          app.config.get('NOTIFICATION_RETENTION_INTERVAL', 3600), lock=job_lock)
+        scheduler.add_job('purge_idempotency_keys', purge_expired_keys, 3600, lock=job_lock)
+        scheduler.add_job('purge_hourly_sales', SalesModel.purge_hourly_rollups, 86400, lock=job_lock)
+    scheduler.start(app)
+    from models.order_ingest import order_queue
+    if should_run_jobs(app):
+        notification_queue.start(app.logger)
+        if app.config.get('ORDER_INGEST_ENABLED'):
+            order_queue.start(app.logger)
+
     # 首页 - 引导页面
     @app.route('/')
     def index():
@@ -103,6 +146,17 @@ def create_app(config_name):
     def health_check():
         return {'status': 'healthy', 'service': 'Harmony Login API'}
 
+    # 连接池与后台任务状态（用于容量评估）；包含内部运行信息，需要登录，/health 保持公开
+    from utils.pubsub import hub
+    from utils.jwt_utils import login_required
+
+    @app.route('/health/db')
+    @login_required
+    def db_pool_stats(_jwt_claims=None):
+        return {'status': 'healthy', 'pool': get_pool_stats(), 'jobs': scheduler.stats(),
+                'pubsub': hub.stats(), 'notification_queue': notification_queue.stats(),
+                'order_queue': order_queue.stats()}
+
     # 图片服务路由
     @app.route('/images/dishes/<path:filename>')
     def serve_dish_image(filename):
@@ -14,7 +14,82 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'root')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '123456')
     DB_NAME = os.getenv('DB_NAME', 'harmony_app')
-    
+
+    # 数据库连接池配置
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '20'))
+    DB_POOL_MAX_LIFETIME = int(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))    # 连接最长存活秒数
+    DB_POOL_WAIT_TIMEOUT = float(os.getenv('DB_POOL_WAIT_TIMEOUT', '5'))     # 借用连接最长等待秒数
+    DB_POOL_PING_INTERVAL = int(os.getenv('DB_POOL_PING_INTERVAL', '30'))    # 空闲超过该秒数借出前做健康检查
+    # 同一 HTTP 请求内的模型调用共享一条连接，请求结束时统一提交/回滚
+    DB_REQUEST_SCOPED_SESSION = os.getenv('DB_REQUEST_SCOPED_SESSION', 'True').lower() == 'true'
+
+    # 后台任务配置
+    BACKGROUND_JOBS_ENABLED = os.getenv('BACKGROUND_JOBS_ENABLED', 'True').lower() == 'true'
+    # 全表扫描类任务（销量/未读数校准、通知保留、幂等键和小时汇总清理）在多 worker 部署时
+    # 通过 MySQL 命名锁 GET_LOCK 每轮只由一个进程执行；设为 False 则本进程不注册这些任务，
+    # 可只在指定的一个实例上开启。热榜计算、购物车落库等进程内任务不受影响
+    SINGLETON_JOBS_ENABLED = os.getenv('SINGLETON_JOBS_ENABLED', 'True').lower() == 'true'
+    DISH_SALES_RECONCILE_INTERVAL = int(os.getenv('DISH_SALES_RECONCILE_INTERVAL', '3600'))  # 菜品销量校准间隔（秒）
+
+    # 缓存配置
+    MENU_CACHE_TTL = int(os.getenv('MENU_CACHE_TTL', '60'))  # 菜单快照缓存秒数（菜品增删改时立即失效）
+    # 版本号 ETag 的最长有效秒数（多进程部署时其他进程的写操作最多延迟这么久被感知）
+    HTTP_ETAG_VERSION_TTL = int(os.getenv('HTTP_ETAG_VERSION_TTL', '30'))
+
+    # 帖子流配置
+    FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', '1000'))  # 超过该粉丝数的作者改为读时拉取
+    FEED_FOLLOW_BACKFILL = int(os.getenv('FEED_FOLLOW_BACKFILL', '50'))              # 新关注时回填到时间线的帖子数
+    FEED_RANK_INTERVAL = int(os.getenv('FEED_RANK_INTERVAL', '300'))                 # "推荐"热度榜重算间隔（秒）
+    FEED_RANK_WINDOW_DAYS = int(os.getenv('FEED_RANK_WINDOW_DAYS', '7'))             # 参与排名的帖子时间范围
+    FEED_RANK_MAX_POSTS = int(os.getenv('FEED_RANK_MAX_POSTS', '1000'))              # 参与排名的帖子上限
+    FEED_RANK_GRAVITY = float(os.getenv('FEED_RANK_GRAVITY', '1.5'))                 # 时间衰减指数
+
+    # 实时推送配置
+    PUBSUB_BROKER = os.getenv('PUBSUB_BROKER', 'local')            # local：单进程；redis：多进程通过 Redis 转发
+    PUBSUB_REDIS_URL = os.getenv('PUBSUB_REDIS_URL', 'redis://localhost:6379/0')
+    PUBSUB_REPLAY_SIZE = int(os.getenv('PUBSUB_REPLAY_SIZE', '100'))  # 每个频道保留用于断线续传的事件数
+    PUBSUB_QUEUE_SIZE = int(os.getenv('PUBSUB_QUEUE_SIZE', '256'))    # 每个连接的待发送事件上限
+    SSE_HEARTBEAT_INTERVAL = int(os.getenv('SSE_HEARTBEAT_INTERVAL', '15'))  # 心跳间隔（秒）
+    SSE_MAX_DURATION = int(os.getenv('SSE_MAX_DURATION', '300'))            # 单次连接最长保持秒数，到期由客户端重连
+    ORDER_LONGPOLL_TIMEOUT = int(os.getenv('ORDER_LONGPOLL_TIMEOUT', '25'))  # 订单长轮询最长挂起秒数
+
+    # 通知配置
+    NOTIFICATION_QUEUE_SIZE = int(os.getenv('NOTIFICATION_QUEUE_SIZE', '1000'))  # 待写入通知队列上限，满了同步写入
+    NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', '2'))           # 写通知的后台线程数
+    NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', '100'))   # 每批最多写入条数
+    # 通知先随业务事务写入 notification_outbox 再由后台搬运（进程崩溃不丢通知）
+    NOTIFICATION_OUTBOX_ENABLED = os.getenv('NOTIFICATION_OUTBOX_ENABLED', 'False').lower() == 'true'
+    NOTIFICATION_OUTBOX_INTERVAL = int(os.getenv('NOTIFICATION_OUTBOX_INTERVAL', '1'))  # 搬运间隔（秒）
+    NOTIFICATION_UNREAD_CACHE_TTL = int(os.getenv('NOTIFICATION_UNREAD_CACHE_TTL', '10'))  # 未读数缓存秒数
+    NOTIFICATION_COUNTER_RECONCILE_INTERVAL = int(os.getenv('NOTIFICATION_COUNTER_RECONCILE_INTERVAL', '3600'))  # 未读计数校准间隔（秒）
+    # 通知保留策略：按类型保留天数、每个用户最多保留条数
+    NOTIFICATION_TTL_DAYS = os.getenv('NOTIFICATION_TTL_DAYS', 'message:30,order:90,follow:90,system:180')
+    NOTIFICATION_KEEP_PER_USER = int(os.getenv('NOTIFICATION_KEEP_PER_USER', '500'))
+    NOTIFICATION_RETENTION_BATCH = int(os.getenv('NOTIFICATION_RETENTION_BATCH', '1000'))       # 每批删除条数
+    NOTIFICATION_RETENTION_INTERVAL = int(os.getenv('NOTIFICATION_RETENTION_INTERVAL', '3600'))  # 清理间隔（秒）
+
+    # 高峰期下单队列：开启后顾客下单先受理返回临时单号，由写入线程合并事务落库
+    ORDER_INGEST_ENABLED = os.getenv('ORDER_INGEST_ENABLED', 'False').lower() == 'true'
+    ORDER_INGEST_QUEUE_SIZE = int(os.getenv('ORDER_INGEST_QUEUE_SIZE', '500'))   # 队列上限，超过返回 429
+    ORDER_INGEST_WORKERS = int(os.getenv('ORDER_INGEST_WORKERS', '2'))           # 写入线程数
+    ORDER_INGEST_BATCH_SIZE = int(os.getenv('ORDER_INGEST_BATCH_SIZE', '20'))    # 每个事务最多合并的订单数
+    ORDER_INGEST_RETRY_AFTER = int(os.getenv('ORDER_INGEST_RETRY_AFTER', '2'))   # 429 响应的 Retry-After 秒数
+
+    # 下单幂等配置
+    IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', '86400'))  # 幂等键保留秒数
+
+    # 购物车配置
+    # db：直接读写 cart_items；memory：购物车保存在进程内存，定期及结算时写回（仅适用于单进程部署）
+    CART_BACKEND = os.getenv('CART_BACKEND', 'db')
+    CART_FLUSH_INTERVAL = int(os.getenv('CART_FLUSH_INTERVAL', '5'))   # 内存购物车写回间隔（秒）
+    CART_IDLE_TTL = int(os.getenv('CART_IDLE_TTL', '1800'))            # 已写回且超过该秒数未访问的购物车移出内存
+
+    # 销售分析配置
+    SALES_TIMESERIES_MAX_DAYS = int(os.getenv('SALES_TIMESERIES_MAX_DAYS', '731'))    # 按天/周查询的最大跨度（天）
+    SALES_HOURLY_MAX_DAYS = int(os.getenv('SALES_HOURLY_MAX_DAYS', '31'))             # 按小时查询的最大跨度（天）
+    SALES_HOURLY_RETENTION_DAYS = int(os.getenv('SALES_HOURLY_RETENTION_DAYS', '90'))  # 小时汇总保留天数
+
     # API配置
     API_HOST = os.getenv('API_HOST', '0.0.0.0')
     API_PORT = int(os.getenv('API_PORT', '5000'))
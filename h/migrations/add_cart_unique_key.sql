@@ -0,0 +1,24 @@
+-- 购物车 (user_id, dish_id) 唯一，加购改为 INSERT ... ON DUPLICATE KEY UPDATE
+
+-- 合并已有的重复行：数量累加到最早的一行，其余删除
+UPDATE cart_items c
+JOIN (
+    SELECT user_id, dish_id, MIN(id) AS keep_id, SUM(quantity) AS total_quantity
+    FROM cart_items
+    GROUP BY user_id, dish_id
+    HAVING COUNT(*) > 1
+) d ON c.id = d.keep_id
+SET c.quantity = d.total_quantity;
+
+DELETE c FROM cart_items c
+JOIN (
+    SELECT user_id, dish_id, MIN(id) AS keep_id
+    FROM cart_items
+    GROUP BY user_id, dish_id
+    HAVING COUNT(*) > 1
+) d ON c.user_id = d.user_id AND c.dish_id = d.dish_id AND c.id <> d.keep_id;
+
+ALTER TABLE cart_items ADD UNIQUE KEY uk_user_dish (user_id, dish_id);
+
+-- 唯一键已覆盖 user_id 前缀
+DROP INDEX IF EXISTS idx_user_id ON cart_items;
@@ -0,0 +1,26 @@
+-- 会话表冗余最后一条消息与双方未读数，会话列表不再逐行子查询messages
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS last_message_id INT DEFAULT NULL AFTER updated_at;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS last_content TEXT AFTER last_message_id;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS last_time TIMESTAMP NULL DEFAULT NULL AFTER last_content;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS user1_unread INT NOT NULL DEFAULT 0 AFTER last_time;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS user2_unread INT NOT NULL DEFAULT 0 AFTER user1_unread;
+
+CREATE INDEX IF NOT EXISTS idx_user1_updated ON conversations(user1_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_user2_updated ON conversations(user2_id, updated_at);
+
+-- 回填最后一条消息
+UPDATE conversations c
+JOIN (
+    SELECT conversation_id, MAX(id) AS last_id
+    FROM messages
+    GROUP BY conversation_id
+) lm ON lm.conversation_id = c.id
+JOIN messages m ON m.id = lm.last_id
+SET c.last_message_id = m.id, c.last_content = m.content, c.last_time = m.created_at;
+
+-- 回填未读数
+UPDATE conversations c
+SET c.user1_unread = (SELECT COUNT(*) FROM messages m
+                      WHERE m.conversation_id = c.id AND m.sender_id != c.user1_id AND m.is_read = 0),
+    c.user2_unread = (SELECT COUNT(*) FROM messages m
+                      WHERE m.conversation_id = c.id AND m.sender_id != c.user2_id AND m.is_read = 0);
@@ -0,0 +1,24 @@
+-- 关注帖子流时间线（发帖时写扩散到粉丝）
+CREATE TABLE IF NOT EXISTS feed_timeline (
+  user_id INT NOT NULL,
+  post_id INT NOT NULL,
+  author_id INT NOT NULL,
+  created_at TIMESTAMP NOT NULL,
+  PRIMARY KEY (user_id, post_id),
+  INDEX idx_user_created (user_id, created_at, post_id),
+  INDEX idx_user_author (user_id, author_id),
+  CONSTRAINT fk_timeline_post FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 粉丝过多、发帖不做写扩散的作者（粉丝读取时拉取）
+CREATE TABLE IF NOT EXISTS feed_pull_authors (
+  user_id INT PRIMARY KEY,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT fk_pull_authors_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 用已有的关注关系回填时间线
+INSERT IGNORE INTO feed_timeline (user_id, post_id, author_id, created_at)
+SELECT f.follower_id, p.id, p.user_id, p.created_at
+FROM follows f
+JOIN posts p ON p.user_id = f.following_id;
@@ -0,0 +1,39 @@
+-- 按小时的店铺/菜品销售汇总，供 /api/sales/timeseries 按小时分桶（超过 SALES_HOURLY_RETENTION_DAYS 的数据由后台任务清理）
+CREATE TABLE IF NOT EXISTS shop_hourly_sales (
+  shop_id INT NOT NULL,
+  sale_hour DATETIME NOT NULL,
+  status VARCHAR(50) NOT NULL,
+  order_count INT NOT NULL DEFAULT 0,
+  revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (shop_id, sale_hour, status),
+  INDEX idx_sale_hour (sale_hour)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS dish_hourly_sales (
+  dish_id INT NOT NULL,
+  sale_hour DATETIME NOT NULL,
+  status VARCHAR(50) NOT NULL,
+  shop_id INT NOT NULL DEFAULT 1,
+  quantity INT NOT NULL DEFAULT 0,
+  revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (dish_id, sale_hour, status),
+  INDEX idx_shop_hour (shop_id, sale_hour),
+  INDEX idx_sale_hour (sale_hour)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 回填最近 90 天的订单（在新版本上线前执行，避免与增量维护重复计数）
+INSERT INTO shop_hourly_sales (shop_id, sale_hour, status, order_count, revenue)
+SELECT COALESCE(shop_id, 1), DATE_FORMAT(created_at, '%Y-%m-%d %H:00:00'), status, COUNT(*), SUM(total_amount)
+FROM orders
+WHERE created_at >= CURDATE() - INTERVAL 90 DAY
+GROUP BY COALESCE(shop_id, 1), DATE_FORMAT(created_at, '%Y-%m-%d %H:00:00'), status
+ON DUPLICATE KEY UPDATE order_count = VALUES(order_count), revenue = VALUES(revenue);
+
+INSERT INTO dish_hourly_sales (dish_id, sale_hour, status, shop_id, quantity, revenue)
+SELECT oi.dish_id, DATE_FORMAT(o.created_at, '%Y-%m-%d %H:00:00'), o.status, MIN(COALESCE(o.shop_id, 1)),
+       SUM(oi.quantity), SUM(oi.quantity * oi.price)
+FROM order_items oi
+JOIN orders o ON oi.order_id = o.id
+WHERE o.created_at >= CURDATE() - INTERVAL 90 DAY
+GROUP BY oi.dish_id, DATE_FORMAT(o.created_at, '%Y-%m-%d %H:00:00'), o.status
+ON DUPLICATE KEY UPDATE quantity = VALUES(quantity), revenue = VALUES(revenue);
@@ -0,0 +1,11 @@
+-- 下单接口幂等键（Idempotency-Key 请求头），重复请求直接重放保存的响应
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  key_hash CHAR(64) PRIMARY KEY,          -- sha256(接口 + 调用者 + 幂等键)
+  request_hash CHAR(64) NOT NULL,         -- 请求体哈希，同一个键用于不同请求时拒绝
+  status_code INT DEFAULT NULL,           -- 为空表示请求仍在处理
+  response_body MEDIUMTEXT,
+  mimetype VARCHAR(100) DEFAULT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  expires_at DATETIME NOT NULL,
+  INDEX idx_expires_at (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
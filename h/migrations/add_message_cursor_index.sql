@@ -0,0 +1,5 @@
+-- 消息列表按 (conversation_id, id) 游标分页
+CREATE INDEX IF NOT EXISTS idx_conversation_msg ON messages(conversation_id, id);
+
+-- 新索引已覆盖外键所需的 conversation_id 前缀，旧的单列索引可以删除
+DROP INDEX IF EXISTS idx_conversation_id ON messages;
@@ -0,0 +1,11 @@
+-- 用户未读通知计数，未读角标查询不再 COUNT 通知表
+CREATE TABLE IF NOT EXISTS notification_counters (
+  user_id INT PRIMARY KEY,
+  unread_count INT NOT NULL DEFAULT 0,
+  CONSTRAINT fk_notification_counters_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 回填现有未读数
+INSERT INTO notification_counters (user_id, unread_count)
+SELECT user_id, COUNT(*) FROM notifications WHERE is_read = 0 GROUP BY user_id
+ON DUPLICATE KEY UPDATE unread_count = VALUES(unread_count);
@@ -0,0 +1,6 @@
+-- 通知发件箱：通知随业务事务写入，由后台任务批量搬运到 notifications
+CREATE TABLE IF NOT EXISTS notification_outbox (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  payload TEXT NOT NULL,                  -- 通知内容（JSON）
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,18 @@
+-- 通知保留策略：合并键与按用户/类型的组合索引
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS group_key VARCHAR(100) DEFAULT NULL AFTER related_type;
+
+-- 回填已有消息通知的合并键（related_id 为消息 id）
+UPDATE notifications n
+JOIN messages m ON m.id = n.related_id
+SET n.group_key = CONCAT('conversation:', m.conversation_id)
+WHERE n.type = 'message' AND n.group_key IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_user_created ON notifications(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_user_read_created ON notifications(user_id, is_read, created_at);
+CREATE INDEX IF NOT EXISTS idx_user_group ON notifications(user_id, group_key);
+CREATE INDEX IF NOT EXISTS idx_type_created ON notifications(type, created_at);
+
+-- 以上组合索引已覆盖的单列索引
+DROP INDEX IF EXISTS idx_user_id ON notifications;
+DROP INDEX IF EXISTS idx_type ON notifications;
+DROP INDEX IF EXISTS idx_is_read ON notifications;
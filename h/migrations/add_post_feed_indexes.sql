@@ -0,0 +1,5 @@
+-- 帖子流游标分页：按 (created_at, id) 倒序翻页
+CREATE INDEX IF NOT EXISTS idx_created_id ON posts(created_at, id);
+
+-- 用户主页帖子游标分页
+CREATE INDEX IF NOT EXISTS idx_user_created_id ON posts(user_id, created_at, id);
@@ -0,0 +1,40 @@
+-- 按天的店铺/菜品销售汇总（下单及订单状态变更时增量维护），店铺今日数据和销售统计不再扫描订单表
+-- user_id 为下单用户，匿名订单记为 0
+CREATE TABLE IF NOT EXISTS shop_daily_sales (
+  shop_id INT NOT NULL,
+  sale_date DATE NOT NULL,
+  status VARCHAR(50) NOT NULL,
+  user_id INT NOT NULL DEFAULT 0,
+  order_count INT NOT NULL DEFAULT 0,
+  revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (shop_id, sale_date, status, user_id),
+  INDEX idx_user_status (user_id, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS dish_daily_sales (
+  dish_id INT NOT NULL,
+  sale_date DATE NOT NULL,
+  status VARCHAR(50) NOT NULL,
+  user_id INT NOT NULL DEFAULT 0,
+  shop_id INT NOT NULL DEFAULT 1,
+  quantity INT NOT NULL DEFAULT 0,
+  revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (dish_id, sale_date, status, user_id),
+  INDEX idx_user_status (user_id, status, dish_id),
+  INDEX idx_shop_date (shop_id, sale_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 回填历史订单（在新版本上线前执行，避免与增量维护重复计数）
+INSERT INTO shop_daily_sales (shop_id, sale_date, status, user_id, order_count, revenue)
+SELECT COALESCE(shop_id, 1), DATE(created_at), status, COALESCE(user_id, 0), COUNT(*), SUM(total_amount)
+FROM orders
+GROUP BY COALESCE(shop_id, 1), DATE(created_at), status, COALESCE(user_id, 0)
+ON DUPLICATE KEY UPDATE order_count = VALUES(order_count), revenue = VALUES(revenue);
+
+INSERT INTO dish_daily_sales (dish_id, sale_date, status, user_id, shop_id, quantity, revenue)
+SELECT oi.dish_id, DATE(o.created_at), o.status, COALESCE(o.user_id, 0), MIN(COALESCE(o.shop_id, 1)),
+       SUM(oi.quantity), SUM(oi.quantity * oi.price)
+FROM order_items oi
+JOIN orders o ON oi.order_id = o.id
+GROUP BY oi.dish_id, DATE(o.created_at), o.status, COALESCE(o.user_id, 0)
+ON DUPLICATE KEY UPDATE quantity = VALUES(quantity), revenue = VALUES(revenue);
@@ -0,0 +1,12 @@
+-- 为dishes表添加累计销量字段（菜单读取直接使用该计数，不再按菜品关联统计order_items）
+ALTER TABLE dishes ADD COLUMN IF NOT EXISTS sales INT NOT NULL DEFAULT 0 AFTER status;
+
+-- 按历史订单回填销量
+UPDATE dishes d
+LEFT JOIN (
+    SELECT oi.dish_id, SUM(oi.quantity) AS total_sold
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.id
+    GROUP BY oi.dish_id
+) s ON s.dish_id = d.id
+SET d.sales = COALESCE(s.total_sold, 0);
@@ -1,6 +1,12 @@
 """购物车数据模型"""
-from .database import get_db_connection
-from models.dish_model import DishModel
+from config import config
+from .database import get_db_connection, call_after_commit
+from .cart_store import cart_store
+
+
+def _memory_store():
+    """CART_BACKEND=memory 时返回进程内购物车存储，否则返回 None（直接读写数据库）"""
+    return cart_store if config['default'].CART_BACKEND == 'memory' else None
 
 
 class CartModel:
@@ -9,78 +15,159 @@ class CartModel:
     @staticmethod
     def get_items(user_id):
         """获取购物车商品"""
+        if _memory_store():
+            return cart_store.get_items(user_id)
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                return CartModel._fetch_items(cursor, user_id)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _fetch_items(cursor, user_id):
+        """在给定游标上读取购物车，写操作后复用同一连接返回最新购物车"""
+        sql = """
+            SELECT ci.id, ci.dish_id, ci.quantity, ci.created_at,
+                   d.name, d.price, d.image_url, d.description
+            FROM cart_items ci
+            JOIN dishes d ON ci.dish_id = d.id
+            WHERE ci.user_id = %s
+            ORDER BY ci.created_at DESC
+        """
+        cursor.execute(sql, (user_id,))
+        items = cursor.fetchall()
+        
+        # 格式化购物车数据
+        formatted_items = []
+        total_amount = 0.0
+        total_quantity = 0
+        
+        for item in items:
+            quantity = item['quantity']
+            price = float(item['price'])
+            amount = quantity * price
+            
+            formatted_item = {
+                'dish_id': item['dish_id'],
+                'quantity': quantity,
+                'name': item['name'],
+                'price': price,
+                'image_url': item.get('image_url', ''),
+                'description': item.get('description', '')
+            }
+            formatted_items.append(formatted_item)
+            total_amount += amount
+            total_quantity += quantity
+        
+        return {
+            'items': formatted_items,
+            'total_amount': round(total_amount, 2),
+            'total_quantity': total_quantity
+        }
+
+    @staticmethod
+    def add_item(user_id, dish_id, quantity=1):
+        """添加商品到购物车，菜品不存在时返回 None"""
+        if _memory_store():
+            return cart_store.add_item(user_id, dish_id, quantity)
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
+                # 单条语句完成"菜品存在校验 + 新增或累加"，依赖 (user_id, dish_id) 唯一键，并发点击不会插入重复行
                 sql = """
-                    SELECT ci.id, ci.dish_id, ci.quantity, ci.created_at,
-                           d.name, d.price, d.image_url, d.description
-                    FROM cart_items ci
-                    JOIN dishes d ON ci.dish_id = d.id
-                    WHERE ci.user_id = %s
-                    ORDER BY ci.created_at DESC
+                    INSERT INTO cart_items (user_id, dish_id, quantity)
+                    SELECT %s, id, %s FROM dishes WHERE id = %s
+                    ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity), updated_at = NOW()
                 """
-                cursor.execute(sql, (user_id,))
-                items = cursor.fetchall()
-                
-                # 格式化购物车数据
-                formatted_items = []
-                total_amount = 0.0
-                total_quantity = 0
+                cursor.execute(sql, (user_id, quantity, dish_id))
+                if cursor.rowcount == 0:
+                    # 更新后数值未变时 rowcount 同样为 0，再确认一次菜品是否存在
+                    cursor.execute("SELECT 1 FROM dishes WHERE id = %s", (dish_id,))
+                    if cursor.fetchone() is None:
+                        return None
                 
-                for item in items:
-                    quantity = item['quantity']
-                    price = float(item['price'])
-                    amount = quantity * price
-                    
-                    formatted_item = {
-                        'dish_id': item['dish_id'],
-                        'quantity': quantity,
-                        'name': item['name'],
-                        'price': price,
-                        'image_url': item.get('image_url', ''),
-                        'description': item.get('description', '')
-                    }
-                    formatted_items.append(formatted_item)
-                    total_amount += amount
-                    total_quantity += quantity
-                
-                return {
-                    'items': formatted_items,
-                    'total_amount': round(total_amount, 2),
-                    'total_quantity': total_quantity
-                }
+                connection.commit()
+                return CartModel._fetch_items(cursor, user_id)
+        except Exception as e:
+            connection.rollback()
+            raise e
         finally:
             connection.close()
 
+    # 批量操作类型：set 设置数量（<=0 即删除）、increment 增减数量、remove 删除
+    BATCH_OPS = ('set', 'increment', 'remove')
+    MAX_BATCH_OPS = 100
+
     @staticmethod
-    def add_item(user_id, dish_id, quantity=1):
-        """添加商品到购物车"""
+    def _parse_ops(ops):
+        """校验批量操作，返回 [(op, dish_id, quantity)]；不合法时抛出 ValueError"""
+        if not isinstance(ops, list) or not ops:
+            raise ValueError("ops 不能为空")
+        if len(ops) > CartModel.MAX_BATCH_OPS:
+            raise ValueError(f"单次最多 {CartModel.MAX_BATCH_OPS} 个操作")
+        parsed = []
+        for op in ops:
+            if not isinstance(op, dict) or op.get('op') not in CartModel.BATCH_OPS:
+                raise ValueError("不支持的操作类型")
+            try:
+                dish_id = int(op.get('dish_id'))
+                quantity = int(op.get('quantity', 0 if op['op'] == 'remove' else 1))
+            except (TypeError, ValueError):
+                raise ValueError("dish_id 或 quantity 无效")
+            parsed.append((op['op'], dish_id, quantity))
+        return parsed
+
+    @staticmethod
+    def apply_ops(user_id, ops):
+        """在一个事务内按顺序执行一组购物车操作，返回最新购物车
+
+        ops: [{'op': 'set'|'increment'|'remove', 'dish_id': int, 'quantity': int}]
+        任一操作不合法或菜品不存在时抛出 ValueError，整批不生效。
+        """
+        parsed = CartModel._parse_ops(ops)
+        if _memory_store():
+            return cart_store.apply_ops(user_id, parsed)
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
-                # 检查商品是否存在
-                dish = DishModel.get_by_id(dish_id)
-                if not dish:
-                    return None
-                
-                # 检查购物车中是否已有该商品
-                check_sql = "SELECT id, quantity FROM cart_items WHERE user_id = %s AND dish_id = %s"
-                cursor.execute(check_sql, (user_id, dish_id))
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # 更新数量
-                    new_quantity = existing['quantity'] + quantity
-                    update_sql = "UPDATE cart_items SET quantity = %s WHERE id = %s"
-                    cursor.execute(update_sql, (new_quantity, existing['id']))
-                else:
-                    # 添加新商品
-                    insert_sql = "INSERT INTO cart_items (user_id, dish_id, quantity) VALUES (%s, %s, %s)"
-                    cursor.execute(insert_sql, (user_id, dish_id, quantity))
-                
+                # 会写入购物车行的操作才需要校验菜品存在
+                dish_ids = sorted({dish_id for op, dish_id, quantity in parsed
+                                   if op == 'increment' or (op == 'set' and quantity > 0)})
+                if dish_ids:
+                    cursor.execute(
+                        f"SELECT id FROM dishes WHERE id IN ({', '.join(['%s'] * len(dish_ids))})",
+                        dish_ids
+                    )
+                    missing = set(dish_ids) - {row['id'] for row in cursor.fetchall()}
+                    if missing:
+                        raise ValueError(f"菜品不存在: {', '.join(str(i) for i in sorted(missing))}")
+
+                for op, dish_id, quantity in parsed:
+                    if op == 'remove' or (op == 'set' and quantity <= 0):
+                        cursor.execute(
+                            "DELETE FROM cart_items WHERE user_id = %s AND dish_id = %s",
+                            (user_id, dish_id)
+                        )
+                    elif op == 'set':
+                        cursor.execute("""
+                            INSERT INTO cart_items (user_id, dish_id, quantity) VALUES (%s, %s, %s)
+                            ON DUPLICATE KEY UPDATE quantity = VALUES(quantity), updated_at = NOW()
+                        """, (user_id, dish_id, quantity))
+                    else:
+                        cursor.execute("""
+                            INSERT INTO cart_items (user_id, dish_id, quantity) VALUES (%s, %s, %s)
+                            ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity), updated_at = NOW()
+                        """, (user_id, dish_id, quantity))
+                        if quantity < 0:
+                            # 减到 0 及以下视为移除
+                            cursor.execute(
+                                "DELETE FROM cart_items WHERE user_id = %s AND dish_id = %s AND quantity <= 0",
+                                (user_id, dish_id)
+                            )
+
                 connection.commit()
-                return CartModel.get_items(user_id)
+                return CartModel._fetch_items(cursor, user_id)
         except Exception as e:
             connection.rollback()
             raise e
@@ -90,6 +177,8 @@ class CartModel:
     @staticmethod
     def update_item(user_id, dish_id, quantity):
         """更新购物车商品数量"""
+        if _memory_store():
+            return cart_store.update_item(user_id, dish_id, quantity)
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
@@ -103,7 +192,7 @@ class CartModel:
                     cursor.execute(update_sql, (quantity, user_id, dish_id))
                 
                 connection.commit()
-                return CartModel.get_items(user_id)
+                return CartModel._fetch_items(cursor, user_id)
         except Exception as e:
             connection.rollback()
             raise e
@@ -113,13 +202,15 @@ class CartModel:
     @staticmethod
     def remove_item(user_id, dish_id):
         """从购物车移除商品"""
+        if _memory_store():
+            return cart_store.remove_item(user_id, dish_id)
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
                 sql = "DELETE FROM cart_items WHERE user_id = %s AND dish_id = %s"
                 cursor.execute(sql, (user_id, dish_id))
                 connection.commit()
-                return CartModel.get_items(user_id)
+                return CartModel._fetch_items(cursor, user_id)
         except Exception as e:
             connection.rollback()
             raise e
@@ -128,14 +219,20 @@ class CartModel:
 
     @staticmethod
     def clear(user_id):
-        """清空购物车"""
+        """清空购物车（结算后调用；内存模式下等订单事务提交后再清空并写回，事务回滚则购物车保持原样）"""
+        if _memory_store():
+            def clear_and_flush():
+                cart_store.clear(user_id)
+                cart_store.flush(user_id)
+            call_after_commit(clear_and_flush)
+            return {'items': [], 'total_amount': 0.0, 'total_quantity': 0}
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
                 sql = "DELETE FROM cart_items WHERE user_id = %s"
                 cursor.execute(sql, (user_id,))
                 connection.commit()
-                return CartModel.get_items(user_id)
+                return CartModel._fetch_items(cursor, user_id)
         except Exception as e:
             connection.rollback()
             raise e
@@ -0,0 +1,230 @@
+"""进程内购物车存储（写回模式）"""
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import config
+from models.database import get_db_connection
+from models.dish_model import DishModel
+
+
+class _CartState:
+    def __init__(self, items):
+        self.items = items          # OrderedDict: dish_id -> [quantity, created_at]
+        self.version = 0            # 每次修改递增
+        self.flushed_version = 0    # 已写回数据库的版本
+        self.last_access = time.monotonic()
+
+    @property
+    def dirty(self):
+        return self.version != self.flushed_version
+
+
+class MemoryCartStore:
+    """购物车保存在进程内存，按用户加锁；定期及结算时把有变更的购物车写回 cart_items
+
+    首次访问某个用户时从数据库加载。仅适用于单进程部署（或按用户粘性路由），
+    多进程各自持有内存副本会互相覆盖。
+    """
+
+    def __init__(self, idle_ttl=1800):
+        self.idle_ttl = idle_ttl
+        self._carts = {}
+        self._locks = {}            # user_id -> [Lock, 持有或等待该锁的线程数]
+        self._lock = threading.Lock()
+        self.flushes = 0
+
+    @contextmanager
+    def _user_lock(self, user_id):
+        """持有用户锁；引用计数记录使用中的线程数，淘汰时只移除无人使用的锁"""
+        with self._lock:
+            entry = self._locks.get(user_id)
+            if entry is None:
+                entry = self._locks[user_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+
+    def _state(self, user_id):
+        """获取用户购物车状态（调用方已持有用户锁）"""
+        state = self._carts.get(user_id)
+        if state is None:
+            state = _CartState(self._load(user_id))
+            with self._lock:
+                self._carts[user_id] = state
+        state.last_access = time.monotonic()
+        return state
+
+    @staticmethod
+    def _load(user_id):
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT dish_id, quantity, created_at FROM cart_items
+                    WHERE user_id = %s ORDER BY created_at
+                """, (user_id,))
+                return OrderedDict(
+                    (row['dish_id'], [row['quantity'], row['created_at'].timestamp() if row['created_at'] else time.time()])
+                    for row in cursor.fetchall()
+                )
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _render(state):
+        """与 CartModel.get_items 相同的返回格式，按加入时间倒序"""
+        dish_index = DishModel.get_dish_index()
+        formatted_items = []
+        total_amount = 0.0
+        total_quantity = 0
+        for dish_id, (quantity, _) in sorted(state.items.items(), key=lambda kv: kv[1][1], reverse=True):
+            dish = dish_index.get(dish_id)
+            if not dish:
+                continue
+            formatted_items.append({
+                'dish_id': dish_id,
+                'quantity': quantity,
+                'name': dish['name'],
+                'price': dish['price'],
+                'image_url': dish.get('image_url', ''),
+                'description': dish.get('description', '')
+            })
+            total_amount += quantity * dish['price']
+            total_quantity += quantity
+        return {
+            'items': formatted_items,
+            'total_amount': round(total_amount, 2),
+            'total_quantity': total_quantity
+        }
+
+    @staticmethod
+    def _set(state, dish_id, quantity):
+        if quantity <= 0:
+            state.items.pop(dish_id, None)
+        elif dish_id in state.items:
+            state.items[dish_id][0] = quantity
+        else:
+            state.items[dish_id] = [quantity, time.time()]
+        state.version += 1
+
+    def get_items(self, user_id):
+        with self._user_lock(user_id):
+            return self._render(self._state(user_id))
+
+    def add_item(self, user_id, dish_id, quantity=1):
+        if dish_id not in DishModel.get_dish_index():
+            return None
+        with self._user_lock(user_id):
+            state = self._state(user_id)
+            current = state.items.get(dish_id, [0])[0]
+            self._set(state, dish_id, current + quantity)
+            return self._render(state)
+
+    def update_item(self, user_id, dish_id, quantity):
+        with self._user_lock(user_id):
+            state = self._state(user_id)
+            # 与数据库实现一致：只修改已有商品
+            if dish_id in state.items or quantity <= 0:
+                self._set(state, dish_id, quantity)
+            return self._render(state)
+
+    def remove_item(self, user_id, dish_id):
+        return self.update_item(user_id, dish_id, 0)
+
+    def clear(self, user_id):
+        with self._user_lock(user_id):
+            state = self._state(user_id)
+            state.items.clear()
+            state.version += 1
+            return self._render(state)
+
+    def apply_ops(self, user_id, parsed):
+        """执行已校验的批量操作 [(op, dish_id, quantity)]"""
+        dish_index = DishModel.get_dish_index()
+        missing = sorted({dish_id for op, dish_id, quantity in parsed
+                          if (op == 'increment' or (op == 'set' and quantity > 0)) and dish_id not in dish_index})
+        if missing:
+            raise ValueError(f"菜品不存在: {', '.join(str(i) for i in missing)}")
+        with self._user_lock(user_id):
+            state = self._state(user_id)
+            for op, dish_id, quantity in parsed:
+                if op == 'remove':
+                    self._set(state, dish_id, 0)
+                elif op == 'set':
+                    self._set(state, dish_id, quantity)
+                else:
+                    self._set(state, dish_id, state.items.get(dish_id, [0])[0] + quantity)
+            return self._render(state)
+
+    def flush(self, user_id=None):
+        """把有变更的购物车写回数据库，并淘汰长时间未访问的已写回购物车"""
+        with self._lock:
+            user_ids = [user_id] if user_id is not None else list(self._carts)
+        now = time.monotonic()
+        error = None
+        for uid in user_ids:
+            with self._user_lock(uid):
+                state = self._carts.get(uid)
+                if state is None:
+                    continue
+                if not state.dirty:
+                    if user_id is None and now - state.last_access > self.idle_ttl:
+                        with self._lock:
+                            self._carts.pop(uid, None)
+                            # 只有当前线程在用时连同锁一起移除；等待中的线程重新从数据库加载
+                            entry = self._locks.get(uid)
+                            if entry is not None and entry[1] == 1:
+                                del self._locks[uid]
+                    continue
+                # 持有用户锁写回：写回期间该用户的修改等待，保证写入的是一致快照
+                try:
+                    self._write(uid, state)
+                except Exception as e:
+                    error = e  # 单个用户写回失败不影响其他用户，下次继续重试
+                    continue
+                state.flushed_version = state.version
+                self.flushes += 1
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def _write(user_id, state):
+        """用内存中的购物车覆盖该用户的 cart_items（独立连接，自行提交）"""
+        connection = get_db_connection(scoped=False)
+        try:
+            with connection.cursor() as cursor:
+                dish_ids = list(state.items)
+                if dish_ids:
+                    cursor.execute(
+                        f"DELETE FROM cart_items WHERE user_id = %s AND dish_id NOT IN ({', '.join(['%s'] * len(dish_ids))})",
+                        (user_id, *dish_ids)
+                    )
+                    cursor.executemany("""
+                        INSERT INTO cart_items (user_id, dish_id, quantity) VALUES (%s, %s, %s)
+                        ON DUPLICATE KEY UPDATE quantity = VALUES(quantity), updated_at = NOW()
+                    """, [(user_id, dish_id, quantity) for dish_id, (quantity, _) in state.items.items()])
+                else:
+                    cursor.execute("DELETE FROM cart_items WHERE user_id = %s", (user_id,))
+                connection.commit()
+        finally:
+            connection.close()
+
+    def stats(self):
+        with self._lock:
+            carts = list(self._carts.values())
+        return {
+            'carts': len(carts),
+            'dirty': sum(1 for state in carts if state.dirty),
+            'flushes': self.flushes,
+        }
+
+
+cart_store = MemoryCartStore(idle_ttl=config['default'].CART_IDLE_TTL)
+atexit.register(cart_store.flush)
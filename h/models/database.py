@@ -1,8 +1,191 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import pymysql
+from flask import current_app, g, has_request_context
 from config import config
 
-def get_db_connection():
-    """获取数据库连接"""
+
+class PoolTimeoutError(TimeoutError):
+    """等待可用数据库连接超时"""
+
+
+class PooledConnection:
+    """连接池借出的连接，close() 时归还连接池而不是真正断开"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        if name == '_raw':
+            raise AttributeError(name)
+        return getattr(self._raw, name)
+
+    def close(self):
+        """归还连接"""
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._raw, self._created_at)
+
+    def __del__(self):
+        # 兜底：调用方异常路径上忘记 close 时，随对象回收归还连接
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """有界、线程安全的 PyMySQL 连接池"""
+
+    def __init__(self, creator, min_size=2, max_size=20, max_lifetime=1800,
+                 wait_timeout=5.0, ping_interval=30):
+        self._creator = creator
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (raw, created_at, last_used)
+        self._size = 0        # 已打开的连接总数（空闲 + 借出）
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+        }
+
+    def warm_up(self):
+        """预先建立 min_size 个连接"""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                raw = self._create()
+            except Exception:
+                self._discard_slot()
+                raise
+            self.release(raw, time.monotonic())
+
+    def acquire(self, timeout=None):
+        """借出一个健康的连接，池满时最多等待 timeout 秒"""
+        timeout = self.wait_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            item = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        item = self._idle.pop()  # LIFO，优先复用最热的连接
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f'等待数据库连接超时（{timeout}s，连接池上限 {self.max_size}）'
+                        )
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+
+            if item is None:
+                try:
+                    raw = self._create()
+                except Exception:
+                    self._discard_slot()
+                    raise
+                created_at = time.monotonic()
+            else:
+                raw, created_at, last_used = item
+                now = time.monotonic()
+                if self.max_lifetime and now - created_at > self.max_lifetime:
+                    self._close_raw(raw)
+                    continue
+                if now - last_used > self.ping_interval and not self._is_alive(raw):
+                    self._close_raw(raw)
+                    continue
+
+            with self._cond:
+                self._stats['checkouts'] += 1
+            return PooledConnection(self, raw, created_at)
+
+    def release(self, raw, created_at):
+        """归还连接：结束未提交的事务后放回空闲队列"""
+        try:
+            # 只读查询同样会开启事务快照，归还前回滚以免下一个借用者读到旧数据
+            raw.rollback()
+        except Exception:
+            self._close_raw(raw)
+            return
+
+        if self.max_lifetime and time.monotonic() - created_at > self.max_lifetime:
+            self._close_raw(raw)
+            return
+
+        with self._cond:
+            self._idle.append((raw, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        """连接池使用情况，用于容量评估"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'size': self._size,
+                'idle': idle,
+                'in_use': self._size - idle,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                **self._stats,
+            }
+
+    def _create(self):
+        raw = self._creator()
+        with self._cond:
+            self._stats['created'] += 1
+        return raw
+
+    def _is_alive(self, raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._cond:
+                self._stats['health_check_failures'] += 1
+            return False
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        self._discard_slot()
+        with self._cond:
+            self._stats['closed'] += 1
+
+    def _discard_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+
+def _connect():
+    """新建一条物理连接"""
     return pymysql.connect(
         host=config['default'].DB_HOST,
         port=config['default'].DB_PORT,
@@ -11,4 +194,197 @@ def get_db_connection():
         database=config['default'].DB_NAME,
         charset='utf8mb4',
         cursorclass=pymysql.cursors.DictCursor
-    )
\ No newline at end of file
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取全局连接池（首次调用时按配置创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                db_config = config['default']
+                _pool = ConnectionPool(
+                    _connect,
+                    min_size=db_config.DB_POOL_MIN_SIZE,
+                    max_size=db_config.DB_POOL_MAX_SIZE,
+                    max_lifetime=db_config.DB_POOL_MAX_LIFETIME,
+                    wait_timeout=db_config.DB_POOL_WAIT_TIMEOUT,
+                    ping_interval=db_config.DB_POOL_PING_INTERVAL,
+                )
+    return _pool
+
+
+def get_pool_stats():
+    """连接池统计信息"""
+    return get_pool().stats()
+
+
+class RequestSession:
+    """请求级数据库会话：同一请求内的所有模型调用共享一条连接和一个事务"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.connection = None
+        self.commit_requested = False
+        self.rollback_only = False
+        self.after_commit = []
+
+    def get_connection(self):
+        """首次使用时才从连接池借出连接"""
+        if self.connection is None:
+            self.connection = self._pool.acquire()
+        return ScopedConnection(self)
+
+    def commit(self):
+        """请求结束时统一提交；只读请求不发送 COMMIT"""
+        if self.connection is None or not self.commit_requested or self.rollback_only:
+            return False
+        self.connection.commit()
+        self.commit_requested = False
+        self.run_after_commit()
+        return True
+
+    def run_after_commit(self):
+        """执行并清空提交后回调（没有需要提交的修改时也由请求结束时调用）"""
+        callbacks, self.after_commit = self.after_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                # 事务已提交，回调失败不影响响应，但要留下记录（通知、购物车写回等可能因此丢失）
+                current_app.logger.error(f'事务提交后回调执行失败 {getattr(callback, "__qualname__", callback)}: {e}')
+
+    def close(self):
+        """归还连接（未提交的修改随归还一起回滚）"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class ScopedConnection:
+    """模型拿到的请求级连接：commit 延迟到请求结束，rollback 使整个请求回滚，close 不归还"""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __getattr__(self, name):
+        if name == '_session':
+            raise AttributeError(name)
+        return getattr(self._session.connection, name)
+
+    def commit(self):
+        self._session.commit_requested = True
+
+    def rollback(self):
+        self._session.rollback_only = True
+        self._session.connection.rollback()
+
+    def close(self):
+        pass
+
+
+def is_server_error(response):
+    """HTTP 状态码或响应体中的 statusCode 表示服务端错误"""
+    if response.status_code >= 500:
+        return True
+    if response.is_json and not response.is_streamed:
+        body = response.get_json(silent=True)
+        if isinstance(body, dict):
+            status_code = body.get('statusCode', body.get('code'))
+            return isinstance(status_code, int) and status_code >= 500
+    return False
+
+
+def init_db_session(app):
+    """注册请求级会话：请求成功结束时提交，出错时回滚，最后归还连接"""
+    if not app.config.get('DB_REQUEST_SCOPED_SESSION', True):
+        return
+
+    @app.before_request
+    def _enable_db_session():
+        g._db_session_enabled = True
+
+    @app.after_request
+    def _commit_db_session(response):
+        session = g.get('_db_session')
+        if session is None:
+            return response
+        if session.rollback_only or is_server_error(response):
+            session.after_commit = []
+            return response
+        if not session.commit_requested:
+            # 没有需要提交的修改也没有回滚，回调照常执行
+            session.run_after_commit()
+            return response
+        try:
+            session.commit()
+        except Exception as e:
+            app.logger.error(f'提交请求事务失败: {e}')
+            return app.response_class(
+                app.json.dumps({'statusCode': 500, 'message': f'保存失败: {str(e)}', 'data': None}),
+                status=500, mimetype='application/json'
+            )
+        return response
+
+    @app.teardown_request
+    def _close_db_session(exc=None):
+        session = g.pop('_db_session', None)
+        if session is not None:
+            session.close()
+
+
+def call_after_commit(callback):
+    """在当前事务提交后执行回调（缓存失效、事件推送等）
+
+    请求级会话中回调延迟到请求结束：正常结束时（无论是否有修改需要提交）在提交后执行，
+    回滚或服务端错误时丢弃；其他场景模型已自行提交，立即执行。
+    """
+    if has_request_context():
+        session = g.get('_db_session')
+        if session is not None and session.connection is not None:
+            session.after_commit.append(callback)
+            return
+    callback()
+
+
+def get_db_connection(scoped=True):
+    """获取数据库连接
+
+    请求上下文中返回请求级共享连接；后台线程等场景从连接池借出独立连接，close() 即归还。
+    scoped=False 时总是借出独立连接，自行提交，不参与请求事务（如请求提交后执行的回调）。
+    """
+    if scoped and has_request_context() and g.get('_db_session_enabled'):
+        session = g.get('_db_session')
+        if session is None:
+            session = g._db_session = RequestSession(get_pool())
+        return session.get_connection()
+    return get_pool().acquire()
+
+
+@contextmanager
+def job_lock(name):
+    """多进程部署时保证同名后台任务同一时刻只有一个进程在跑
+
+    用独立连接获取 MySQL 命名锁 GET_LOCK（不等待），yield 是否拿到锁；
+    命名锁跟随会话，执行完主动释放，进程崩溃时随连接断开自动释放。
+    """
+    connection = get_db_connection(scoped=False)
+    acquired = False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (f'harmony_job:{name}',))
+            row = cursor.fetchone()
+            acquired = bool(row and row['acquired'])
+        yield acquired
+    finally:
+        try:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT RELEASE_LOCK(%s)", (f'harmony_job:{name}',))
+        finally:
+            connection.close()
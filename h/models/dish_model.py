@@ -1,5 +1,10 @@
 """菜品数据模型"""
-from .database import get_db_connection
+from config import config
+from utils.cache import TTLCache
+from .database import get_db_connection, call_after_commit
+
+# 菜单快照缓存：key 为 (视图, shop_id)，值为预先序列化好的响应体
+menu_cache = TTLCache(ttl=config['default'].MENU_CACHE_TTL, maxsize=256)
 
 
 class DishModel:
@@ -13,10 +18,7 @@ class DishModel:
             with connection.cursor() as cursor:
                 sql = """
                     SELECT id, name, description, cooking_method, price, image_url, category, 
-                           is_recommended, status, created_at,
-                           (SELECT COUNT(*) FROM order_items oi 
-                            JOIN orders o ON oi.order_id = o.id 
-                            WHERE oi.dish_id = dishes.id) as sales
+                           is_recommended, status, created_at, sales
                     FROM dishes
                     WHERE shop_id = %s
                     ORDER BY created_at DESC
@@ -34,10 +36,7 @@ class DishModel:
             with connection.cursor() as cursor:
                 sql = """
                     SELECT id, name, description, cooking_method, price, image_url, category, 
-                           is_recommended, status, created_at,
-                           (SELECT COUNT(*) FROM order_items oi 
-                            JOIN orders o ON oi.order_id = o.id 
-                            WHERE oi.dish_id = dishes.id) as sales
+                           is_recommended, status, created_at, sales
                     FROM dishes
                     WHERE id = %s
                 """
@@ -46,6 +45,47 @@ class DishModel:
         finally:
             connection.close()
 
+    @staticmethod
+    def get_customer_menu():
+        """获取顾客端菜单（仅上架菜品）"""
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                sql = """
+                    SELECT id, name, price, image_url, category, description, 
+                           rating, sales, is_available
+                    FROM dishes 
+                    WHERE is_available = 1
+                    ORDER BY category, sales DESC
+                """
+                cursor.execute(sql)
+                return cursor.fetchall()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def get_dish_index():
+        """全部菜品按 id 索引（走菜单缓存，菜品增删改时随缓存一起失效），调用方不要修改返回值"""
+        return menu_cache.get_or_load(('dish_index', None), DishModel._load_dish_index)
+
+    @staticmethod
+    def _load_dish_index():
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, shop_id, name, description, price, image_url, category, status
+                    FROM dishes
+                """)
+                return {row['id']: {**row, 'price': float(row['price'])} for row in cursor.fetchall()}
+        finally:
+            connection.close()
+
+    @staticmethod
+    def invalidate_menu():
+        """菜品变更后清空菜单快照缓存（事务提交后生效）"""
+        call_after_commit(menu_cache.clear)
+
     @staticmethod
     def create(shop_id, name, description="", cooking_method="", price=0.0, image_url="", 
                category="", is_recommended=False, status="available"):
@@ -61,6 +101,7 @@ class DishModel:
                 cursor.execute(sql, (shop_id, name, description, cooking_method, price, image_url, 
                                    category, is_recommended, status))
                 connection.commit()
+                DishModel.invalidate_menu()
                 return DishModel.get_by_id(cursor.lastrowid)
         except Exception as e:
             connection.rollback()
@@ -110,6 +151,7 @@ class DishModel:
                 sql = f"UPDATE dishes SET {', '.join(updates)} WHERE id = %s"
                 cursor.execute(sql, params)
                 connection.commit()
+                DishModel.invalidate_menu()
                 return DishModel.get_by_id(dish_id)
         except Exception as e:
             connection.rollback()
@@ -126,6 +168,7 @@ class DishModel:
                 sql = "DELETE FROM dishes WHERE id = %s"
                 cursor.execute(sql, (dish_id,))
                 connection.commit()
+                DishModel.invalidate_menu()
                 return cursor.rowcount > 0
         except Exception as e:
             connection.rollback()
@@ -133,3 +176,28 @@ class DishModel:
         finally:
             connection.close()
 
+    @staticmethod
+    def reconcile_sales():
+        """按 order_items 重建 dishes.sales 计数（后台校准任务，修正增量更新的偏差）"""
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                sql = """
+                    UPDATE dishes d
+                    LEFT JOIN (
+                        SELECT oi.dish_id, SUM(oi.quantity) AS total_sold
+                        FROM order_items oi
+                        JOIN orders o ON oi.order_id = o.id
+                        GROUP BY oi.dish_id
+                    ) s ON s.dish_id = d.id
+                    SET d.sales = COALESCE(s.total_sold, 0)
+                    WHERE d.sales <> COALESCE(s.total_sold, 0)
+                """
+                cursor.execute(sql)
+                connection.commit()
+                return cursor.rowcount
+        except Exception as e:
+            connection.rollback()
+            raise e
+        finally:
+            connection.close()
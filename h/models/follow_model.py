@@ -1,4 +1,8 @@
 from models.database import get_db_connection
+from config import config
+
+# 新关注时回填到时间线的帖子数
+FEED_FOLLOW_BACKFILL = config['default'].FEED_FOLLOW_BACKFILL
 
 
 class FollowModel:
@@ -26,6 +30,17 @@ class FollowModel:
                 # 添加关注
                 sql = "INSERT INTO follows (follower_id, following_id) VALUES (%s, %s)"
                 cursor.execute(sql, (follower_id, following_id))
+                
+                # 把对方最近的帖子回填到自己的时间线
+                sql = """
+                    INSERT IGNORE INTO feed_timeline (user_id, post_id, author_id, created_at)
+                    SELECT %s, p.id, p.user_id, p.created_at
+                    FROM posts p
+                    WHERE p.user_id = %s
+                    ORDER BY p.created_at DESC, p.id DESC
+                    LIMIT %s
+                """
+                cursor.execute(sql, (follower_id, following_id, FEED_FOLLOW_BACKFILL))
                 connection.commit()
                 return True, "关注成功"
         except Exception as e:
@@ -42,8 +57,13 @@ class FollowModel:
             with connection.cursor() as cursor:
                 sql = "DELETE FROM follows WHERE follower_id = %s AND following_id = %s"
                 cursor.execute(sql, (follower_id, following_id))
+                deleted = cursor.rowcount > 0
+                
+                # 从时间线移除对方的帖子
+                sql = "DELETE FROM feed_timeline WHERE user_id = %s AND author_id = %s"
+                cursor.execute(sql, (follower_id, following_id))
                 connection.commit()
-                return cursor.rowcount > 0
+                return deleted
         finally:
             connection.close()
 
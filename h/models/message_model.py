@@ -1,5 +1,5 @@
-from models.database import get_db_connection
-from datetime import datetime
+from models.database import call_after_commit, get_db_connection
+from utils.pubsub import hub, user_channel
 import time
 
 
@@ -10,22 +10,26 @@ class MessageModel:
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
+                # 最后一条消息与未读数由 send_message / mark_messages_read 维护在会话表上；
+                # 两个方向分别走 (user1_id, updated_at) / (user2_id, updated_at) 索引；
+                # 自己和自己的会话只在第一个分支返回，避免 UNION ALL 重复
                 sql = """
-                    SELECT c.id, c.user1_id, c.user2_id, c.updated_at,
-                           CASE WHEN c.user1_id = %s THEN u2.id ELSE u1.id END as other_user_id,
-                           CASE WHEN c.user1_id = %s THEN u2.username ELSE u1.username END as username,
-                           CASE WHEN c.user1_id = %s THEN u2.avatar ELSE u1.avatar END as avatar,
-                           CASE WHEN c.user1_id = %s THEN u2.email ELSE u1.email END as email,
-                           (SELECT content FROM messages WHERE conversation_id = c.id ORDER BY created_at DESC LIMIT 1) as last_content,
-                           (SELECT created_at FROM messages WHERE conversation_id = c.id ORDER BY created_at DESC LIMIT 1) as last_time,
-                           (SELECT COUNT(*) FROM messages WHERE conversation_id = c.id AND sender_id != %s AND is_read = 0) as unread_count
+                    SELECT c.id, c.updated_at, c.last_content, c.last_time,
+                           c.user1_unread as unread_count,
+                           u.id as other_user_id, u.username, u.avatar, u.email
                     FROM conversations c
-                    LEFT JOIN users u1 ON c.user1_id = u1.id
-                    LEFT JOIN users u2 ON c.user2_id = u2.id
-                    WHERE c.user1_id = %s OR c.user2_id = %s
-                    ORDER BY c.updated_at DESC
+                    LEFT JOIN users u ON c.user2_id = u.id
+                    WHERE c.user1_id = %s
+                    UNION ALL
+                    SELECT c.id, c.updated_at, c.last_content, c.last_time,
+                           c.user2_unread as unread_count,
+                           u.id as other_user_id, u.username, u.avatar, u.email
+                    FROM conversations c
+                    LEFT JOIN users u ON c.user1_id = u.id
+                    WHERE c.user2_id = %s AND c.user1_id <> c.user2_id
+                    ORDER BY updated_at DESC
                 """
-                cursor.execute(sql, (user_id, user_id, user_id, user_id, user_id, user_id, user_id))
+                cursor.execute(sql, (user_id, user_id))
                 results = cursor.fetchall()
                 conversations = []
                 for row in results:
@@ -53,20 +57,44 @@ class MessageModel:
             connection.close()
 
     @staticmethod
-    def get_messages(conversation_id, user_id):
-        """获取会话的消息列表"""
+    def get_messages(conversation_id, user_id, before_id=None, after_id=None, limit=50):
+        """获取会话的消息列表（按消息 id 游标分页，结果按时间正序）
+
+        - 默认返回最新的 limit 条
+        - before_id：加载比该消息更早的一页
+        - after_id：增量拉取该消息之后的新消息
+        """
+        limit = max(1, min(int(limit), 100))
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
-                sql = """
+                where = "conversation_id = %s"
+                params = [conversation_id]
+                if after_id is not None:
+                    where += " AND id > %s"
+                    params.append(after_id)
+                    order = "ASC"
+                else:
+                    if before_id is not None:
+                        where += " AND id < %s"
+                        params.append(before_id)
+                    order = "DESC"
+                # 多取一条判断是否还有更多，走 (conversation_id, id) 索引
+                sql = f"""
                     SELECT id, conversation_id, sender_id, content, type, 
                            image_url, voice_url, voice_duration, video_url, is_read, created_at
                     FROM messages
-                    WHERE conversation_id = %s
-                    ORDER BY created_at ASC
+                    WHERE {where}
+                    ORDER BY id {order}
+                    LIMIT %s
                 """
-                cursor.execute(sql, (conversation_id,))
-                results = cursor.fetchall()
+                params.append(limit + 1)
+                cursor.execute(sql, params)
+                results = list(cursor.fetchall())
+                has_more = len(results) > limit
+                results = results[:limit]
+                if order == "DESC":
+                    results.reverse()
                 messages = []
                 for row in results:
                     msg = {
@@ -81,7 +109,7 @@ class MessageModel:
                         'videoUrl': row['video_url'] or ''
                     }
                     messages.append(msg)
-                return messages
+                return {'messages': messages, 'has_more': has_more, 'limit': limit}
         finally:
             connection.close()
 
@@ -98,11 +126,19 @@ class MessageModel:
                 cursor.execute(sql, (conversation_id, sender_id, content, msg_type, image_url, voice_url, voice_duration, video_url))
                 message_id = cursor.lastrowid
                 
-                # 更新会话的更新时间
-                cursor.execute("UPDATE conversations SET updated_at = NOW() WHERE id = %s", (conversation_id,))
+                # 更新会话的最后一条消息，并给接收方的未读数加一
+                cursor.execute("""
+                    UPDATE conversations
+                    SET updated_at = NOW(), last_message_id = %s, last_content = %s, last_time = NOW(),
+                        user1_unread = user1_unread + CASE WHEN user1_id = %s THEN 0 ELSE 1 END,
+                        user2_unread = user2_unread + CASE WHEN user2_id = %s THEN 0 ELSE 1 END
+                    WHERE id = %s
+                """, (message_id, content, sender_id, sender_id, conversation_id))
+                cursor.execute("SELECT user1_id, user2_id FROM conversations WHERE id = %s", (conversation_id,))
+                conversation = cursor.fetchone()
                 connection.commit()
                 
-                return {
+                message = {
                     'id': message_id,
                     'content': content,
                     'time': int(time.time()),
@@ -112,6 +148,14 @@ class MessageModel:
                     'voiceDuration': voice_duration,
                     'videoUrl': video_url or ''
                 }
+                
+                # 提交后推送给接收方
+                if conversation:
+                    receiver_id = conversation['user2_id'] if conversation['user1_id'] == sender_id else conversation['user1_id']
+                    event = {**message, 'conversationId': conversation_id, 'senderId': sender_id, 'isMe': False}
+                    call_after_commit(lambda: hub.publish(user_channel(receiver_id), 'message', event))
+                    message['receiverId'] = receiver_id
+                return message
         finally:
             connection.close()
 
@@ -145,10 +189,19 @@ class MessageModel:
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
-                sql = "UPDATE messages SET is_read = 1 WHERE conversation_id = %s AND sender_id != %s"
+                sql = "UPDATE messages SET is_read = 1 WHERE conversation_id = %s AND sender_id != %s AND is_read = 0"
                 cursor.execute(sql, (conversation_id, user_id))
+                marked = cursor.rowcount
+                
+                # 清零自己在该会话的未读数
+                cursor.execute("""
+                    UPDATE conversations
+                    SET user1_unread = CASE WHEN user1_id = %s THEN 0 ELSE user1_unread END,
+                        user2_unread = CASE WHEN user2_id = %s THEN 0 ELSE user2_unread END
+                    WHERE id = %s
+                """, (user_id, user_id, conversation_id))
                 connection.commit()
-                return cursor.rowcount
+                return marked
         finally:
             connection.close()
 
@@ -1,5 +1,18 @@
 """通知数据模型"""
-from models.database import get_db_connection
+import json
+import time
+from collections import Counter
+
+from config import config
+from models.database import call_after_commit, get_db_connection
+from utils.batch_queue import BatchQueue
+from utils.cache import TTLCache
+from utils.pubsub import hub, user_channel
+
+_NOTIFICATION_FIELDS = ('user_id', 'type', 'title', 'content', 'related_id', 'related_type', 'group_key')
+
+# 未读数缓存：user_id -> 未读数，计数变更提交后失效
+unread_cache = TTLCache(ttl=config['default'].NOTIFICATION_UNREAD_CACHE_TTL, maxsize=10000)
 
 
 class NotificationModel:
@@ -12,19 +25,20 @@ class NotificationModel:
     TYPE_SYSTEM = 'system'
     
     @staticmethod
-    def create(user_id, notification_type, title, content, related_id=None, related_type=None):
+    def create(user_id, notification_type, title, content, related_id=None, related_type=None, group_key=None):
         """创建通知"""
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
                 sql = """
-                    INSERT INTO notifications (user_id, type, title, content, related_id, related_type)
-                    VALUES (%s, %s, %s, %s, %s, %s)
+                    INSERT INTO notifications (user_id, type, title, content, related_id, related_type, group_key)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
                 """
-                cursor.execute(sql, (user_id, notification_type, title, content, related_id, related_type))
+                cursor.execute(sql, (user_id, notification_type, title, content, related_id, related_type, group_key))
                 notification_id = cursor.lastrowid
+                NotificationModel._incr_unread(cursor, {user_id: 1})
                 connection.commit()
-                return {
+                notification = {
                     'id': notification_id,
                     'user_id': user_id,
                     'type': notification_type,
@@ -32,17 +46,142 @@ class NotificationModel:
                     'content': content,
                     'related_id': related_id,
                     'related_type': related_type,
+                    'group_key': group_key,
                     'is_read': False
                 }
+                call_after_commit(lambda: unread_cache.delete(user_id))
+                call_after_commit(lambda: NotificationModel._publish(notification))
+                return notification
         finally:
             connection.close()
     
+    @staticmethod
+    def _incr_unread(cursor, counts):
+        """增加用户未读计数：counts 为 {user_id: 增量}"""
+        cursor.executemany("""
+            INSERT INTO notification_counters (user_id, unread_count) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE unread_count = unread_count + VALUES(unread_count)
+        """, list(counts.items()))
+    
+    @staticmethod
+    def _decr_unread(cursor, user_id):
+        cursor.execute(
+            "UPDATE notification_counters SET unread_count = GREATEST(unread_count - 1, 0) WHERE user_id = %s",
+            (user_id,)
+        )
+    
+    @staticmethod
+    def _publish(notification):
+        event = {**notification, 'created_at': int(time.time())}
+        hub.publish(user_channel(notification['user_id']), 'notification', event)
+    
+    @staticmethod
+    def _insert_batch(cursor, notifications):
+        """多行 INSERT 写入一批通知，返回的通知不带 id
+
+        innodb_autoinc_lock_mode=2（MySQL 8 默认）下多行 INSERT 的自增 id 不保证连续，
+        推送事件中不含 id，客户端收到后重新拉取通知列表再做已读/删除。
+        """
+        cursor.executemany("""
+            INSERT INTO notifications (user_id, type, title, content, related_id, related_type, group_key)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, [tuple(n.get(field) for field in _NOTIFICATION_FIELDS) for n in notifications])
+        NotificationModel._incr_unread(cursor, Counter(n['user_id'] for n in notifications))
+        return [{**n, 'is_read': False} for n in notifications]
+    
+    @staticmethod
+    def create_batch(notifications):
+        """批量创建通知（后台队列使用，独立连接自行提交，不参与请求事务）"""
+        if not notifications:
+            return []
+        connection = get_db_connection(scoped=False)
+        try:
+            with connection.cursor() as cursor:
+                created = NotificationModel._insert_batch(cursor, notifications)
+                connection.commit()
+        finally:
+            connection.close()
+        for notification in created:
+            unread_cache.delete(notification['user_id'])
+            NotificationModel._publish(notification)
+        return created
+    
+    @staticmethod
+    def enqueue(user_id, notification_type, title, content, related_id=None, related_type=None, group_key=None):
+        """异步创建通知：不在请求内写通知表
+
+        - 默认在当前事务提交后放入内存队列，由后台线程批量写入；队列满时同步写入
+        - 开启 NOTIFICATION_OUTBOX_ENABLED 时随当前事务写入 notification_outbox，
+          由 relay_outbox 任务搬运，进程崩溃也不会丢失
+        """
+        notification = {
+            'user_id': user_id,
+            'type': notification_type,
+            'title': title,
+            'content': content,
+            'related_id': related_id,
+            'related_type': related_type,
+            'group_key': group_key
+        }
+        if config['default'].NOTIFICATION_OUTBOX_ENABLED:
+            connection = get_db_connection()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO notification_outbox (payload) VALUES (%s)",
+                        (json.dumps(notification, ensure_ascii=False),)
+                    )
+                    connection.commit()
+            finally:
+                connection.close()
+            return
+
+        def dispatch():
+            if not notification_queue.submit(notification):
+                NotificationModel.create_batch([notification])
+        call_after_commit(dispatch)
+    
+    @staticmethod
+    def relay_outbox(batch_size=None):
+        """把 notification_outbox 中的通知批量搬运到通知表，返回搬运条数"""
+        batch_size = batch_size or config['default'].NOTIFICATION_BATCH_SIZE
+        relayed = 0
+        while True:
+            connection = get_db_connection(scoped=False)
+            try:
+                with connection.cursor() as cursor:
+                    # 普通 FOR UPDATE（兼容 MySQL 5.7）：搬运由单个后台任务执行，
+                    # 偶有并发时后来者等待前一批提交，不会重复搬运
+                    cursor.execute("""
+                        SELECT id, payload FROM notification_outbox
+                        ORDER BY id LIMIT %s
+                        FOR UPDATE
+                    """, (batch_size,))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        return relayed
+                    created = NotificationModel._insert_batch(cursor, [json.loads(row['payload']) for row in rows])
+                    ids = [row['id'] for row in rows]
+                    cursor.execute(
+                        f"DELETE FROM notification_outbox WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                        ids
+                    )
+                    connection.commit()
+            finally:
+                connection.close()
+            for notification in created:
+                unread_cache.delete(notification['user_id'])
+                NotificationModel._publish(notification)
+            relayed += len(rows)
+            if len(rows) < batch_size:
+                return relayed
+    
     @staticmethod
     def create_order_notification(merchant_user_id, order_id, table_id, total_amount, item_count):
-        """创建订单通知（给商家）"""
+        """创建订单通知（给商家，异步写入）"""
         title = '📋 新订单提醒'
         content = f'{table_id}号桌下单，{item_count}件商品，¥{total_amount:.2f}'
-        return NotificationModel.create(
+        return NotificationModel.enqueue(
             user_id=merchant_user_id,
             notification_type=NotificationModel.TYPE_ORDER,
             title=title,
@@ -53,17 +192,18 @@ class NotificationModel:
     
     @staticmethod
     def create_message_notification(receiver_id, sender_name, message_content, conversation_id, message_id):
-        """创建消息通知"""
+        """创建消息通知（异步写入）"""
         title = f'💬 {sender_name}'
         # 截断过长内容
         display_content = message_content[:50] + '...' if len(message_content) > 50 else message_content
-        return NotificationModel.create(
+        return NotificationModel.enqueue(
             user_id=receiver_id,
             notification_type=NotificationModel.TYPE_MESSAGE,
             title=title,
             content=display_content,
             related_id=message_id,
-            related_type='conversation'
+            related_type='conversation',
+            group_key=f'conversation:{conversation_id}'  # 同一会话的消息通知在保留策略中合并为一条
         )
     
     @staticmethod
@@ -108,14 +248,17 @@ class NotificationModel:
     
     @staticmethod
     def get_unread_count(user_id):
-        """获取未读通知数量"""
+        """获取未读通知数量（读计数表，带进程内缓存）"""
+        return unread_cache.get_or_load(user_id, lambda: NotificationModel._load_unread_count(user_id))
+    
+    @staticmethod
+    def _load_unread_count(user_id):
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
-                sql = "SELECT COUNT(*) as count FROM notifications WHERE user_id = %s AND is_read = 0"
-                cursor.execute(sql, (user_id,))
+                cursor.execute("SELECT unread_count FROM notification_counters WHERE user_id = %s", (user_id,))
                 result = cursor.fetchone()
-                return result['count'] if result else 0
+                return result['unread_count'] if result else 0
         finally:
             connection.close()
     
@@ -125,10 +268,15 @@ class NotificationModel:
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
-                sql = "UPDATE notifications SET is_read = 1 WHERE id = %s AND user_id = %s"
+                sql = "UPDATE notifications SET is_read = 1 WHERE id = %s AND user_id = %s AND is_read = 0"
                 cursor.execute(sql, (notification_id, user_id))
+                updated = cursor.rowcount > 0
+                if updated:
+                    NotificationModel._decr_unread(cursor, user_id)
                 connection.commit()
-                return cursor.rowcount > 0
+                if updated:
+                    call_after_commit(lambda: unread_cache.delete(user_id))
+                return updated
         finally:
             connection.close()
     
@@ -140,8 +288,11 @@ class NotificationModel:
             with connection.cursor() as cursor:
                 sql = "UPDATE notifications SET is_read = 1 WHERE user_id = %s AND is_read = 0"
                 cursor.execute(sql, (user_id,))
+                marked = cursor.rowcount
+                cursor.execute("UPDATE notification_counters SET unread_count = 0 WHERE user_id = %s", (user_id,))
                 connection.commit()
-                return cursor.rowcount
+                call_after_commit(lambda: unread_cache.delete(user_id))
+                return marked
         finally:
             connection.close()
     
@@ -151,10 +302,140 @@ class NotificationModel:
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT is_read FROM notifications WHERE id = %s AND user_id = %s FOR UPDATE",
+                    (notification_id, user_id)
+                )
+                row = cursor.fetchone()
+                if not row:
+                    return False
                 sql = "DELETE FROM notifications WHERE id = %s AND user_id = %s"
                 cursor.execute(sql, (notification_id, user_id))
+                if not row['is_read']:
+                    NotificationModel._decr_unread(cursor, user_id)
                 connection.commit()
-                return cursor.rowcount > 0
+                if not row['is_read']:
+                    call_after_commit(lambda: unread_cache.delete(user_id))
+                return True
         finally:
             connection.close()
+    
+    @staticmethod
+    def reconcile_unread_counts():
+        """按通知表重新校准未读计数（后台任务，修正并发或异常路径造成的偏差）"""
+        connection = get_db_connection(scoped=False)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO notification_counters (user_id, unread_count)
+                    SELECT user_id, COUNT(*) FROM notifications WHERE is_read = 0 GROUP BY user_id
+                    ON DUPLICATE KEY UPDATE unread_count = VALUES(unread_count)
+                """)
+                cursor.execute("""
+                    UPDATE notification_counters c
+                    LEFT JOIN (
+                        SELECT user_id FROM notifications WHERE is_read = 0 GROUP BY user_id
+                    ) n ON n.user_id = c.user_id
+                    SET c.unread_count = 0
+                    WHERE n.user_id IS NULL AND c.unread_count != 0
+                """)
+                connection.commit()
+        finally:
+            connection.close()
+        unread_cache.clear()
+    
+    @staticmethod
+    def _delete_in_batches(select_sql, params, batch_size):
+        """按 select_sql 分批选出待删除的通知 id 并删除，每批单独提交，避免长事务和大范围锁"""
+        deleted = 0
+        while True:
+            connection = get_db_connection(scoped=False)
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(select_sql + " LIMIT %s", (*params, batch_size))
+                    ids = [row['id'] for row in cursor.fetchall()]
+                    if ids:
+                        cursor.execute(
+                            f"DELETE FROM notifications WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                            ids
+                        )
+                        connection.commit()
+            finally:
+                connection.close()
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                return deleted
+    
+    @staticmethod
+    def apply_retention():
+        """通知保留策略（后台任务）
+
+        1. 按类型过期：NOTIFICATION_TTL_DAYS，如 "message:30,order:90"
+        2. 同一会话的消息通知只保留最新一条（group_key 相同）
+        3. 每个用户最多保留 NOTIFICATION_KEEP_PER_USER 条
+        删除后重新校准未读计数，返回删除条数。
+        """
+        retention_config = config['default']
+        batch_size = retention_config.NOTIFICATION_RETENTION_BATCH
+        deleted = 0
+
+        for item in retention_config.NOTIFICATION_TTL_DAYS.split(','):
+            notification_type, _, days = item.partition(':')
+            if not notification_type.strip() or not days.strip():
+                continue
+            deleted += NotificationModel._delete_in_batches("""
+                SELECT id FROM notifications
+                WHERE type = %s AND created_at < NOW() - INTERVAL %s DAY
+            """, (notification_type.strip(), int(days)), batch_size)
+
+        deleted += NotificationModel._delete_in_batches("""
+            SELECT n.id FROM notifications n
+            JOIN (
+                SELECT user_id, group_key, MAX(id) AS keep_id
+                FROM notifications
+                WHERE group_key IS NOT NULL
+                GROUP BY user_id, group_key
+                HAVING COUNT(*) > 1
+            ) g ON g.user_id = n.user_id AND g.group_key = n.group_key
+            WHERE n.id < g.keep_id
+        """, (), batch_size)
+
+        keep = retention_config.NOTIFICATION_KEEP_PER_USER
+        connection = get_db_connection(scoped=False)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT user_id FROM notifications
+                    GROUP BY user_id HAVING COUNT(*) > %s
+                """, (keep,))
+                user_ids = [row['user_id'] for row in cursor.fetchall()]
+                cutoffs = []
+                for user_id in user_ids:
+                    # 第 keep+1 新的通知及更早的都删除
+                    cursor.execute("""
+                        SELECT id FROM notifications WHERE user_id = %s
+                        ORDER BY id DESC LIMIT 1 OFFSET %s
+                    """, (user_id, keep))
+                    row = cursor.fetchone()
+                    if row:
+                        cutoffs.append((user_id, row['id']))
+        finally:
+            connection.close()
+        for user_id, cutoff_id in cutoffs:
+            deleted += NotificationModel._delete_in_batches(
+                "SELECT id FROM notifications WHERE user_id = %s AND id <= %s",
+                (user_id, cutoff_id), batch_size
+            )
+
+        if deleted:
+            NotificationModel.reconcile_unread_counts()
+        return deleted
+
 
+notification_queue = BatchQueue(
+    'notification-writer',
+    NotificationModel.create_batch,
+    maxsize=config['default'].NOTIFICATION_QUEUE_SIZE,
+    workers=config['default'].NOTIFICATION_WORKERS,
+    batch_size=config['default'].NOTIFICATION_BATCH_SIZE,
+)
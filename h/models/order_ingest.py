@@ -0,0 +1,110 @@
+"""高峰期下单队列：先受理、后由写入线程合并事务落库"""
+import uuid
+
+from config import config
+from models.database import get_db_connection
+from models.notification_model import NotificationModel
+from models.order_model import OrderModel
+from utils.batch_queue import BatchQueue
+from utils.cache import TTLCache
+
+# 受理结果：provisional_id -> {'status': queued/committed/failed, 'order_id', 'error'}
+# 只保存在受理请求的进程内，多进程部署时查询需路由回同一进程
+_results = TTLCache(ttl=3600, maxsize=100000)
+
+
+def _write_group(batch):
+    """一组订单一个事务：每笔订单一个保存点，单笔失败只回滚这一笔；销量合并成一条 UPDATE"""
+    for attempt in range(2):
+        committed = []
+        failed = []
+        sales = {}
+        connection = get_db_connection(scoped=False)
+        try:
+            with connection.cursor() as cursor:
+                for request in batch:
+                    cursor.execute("SAVEPOINT ingest_order")
+                    try:
+                        order, event = OrderModel._write_order(
+                            cursor, request['user_id'], request['items'],
+                            table_id=request['table_id'], remark=request['remark'],
+                            status=request['status'], shop_id=request['shop_id'], sales=sales
+                        )
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT ingest_order")
+                        failed.append((request, str(e)))
+                        continue
+                    committed.append((request, order, event))
+                OrderModel._add_sales(cursor, sales)
+                connection.commit()
+            break
+        except Exception as e:
+            connection.rollback()
+            # 整组失败（如死锁）重试一次，仍失败则整组标记失败
+            if attempt == 1:
+                for request in batch:
+                    _results.set(request['provisional_id'], {'status': 'failed', 'error': str(e)})
+                raise
+        finally:
+            connection.close()
+
+    for request, error in failed:
+        _results.set(request['provisional_id'], {'status': 'failed', 'error': error})
+    for request, order, event in committed:
+        _results.set(request['provisional_id'], {'status': 'committed', 'order_id': order['order_id']})
+        OrderModel._after_order_committed(event)
+        if request.get('notify_user_id'):
+            NotificationModel.create_order_notification(
+                merchant_user_id=request['notify_user_id'],
+                order_id=order['order_id'],
+                table_id=request['table_id'],
+                total_amount=order['total_amount'],
+                item_count=order['item_count']
+            )
+
+
+order_queue = BatchQueue(
+    'order-writer',
+    _write_group,
+    maxsize=config['default'].ORDER_INGEST_QUEUE_SIZE,
+    workers=config['default'].ORDER_INGEST_WORKERS,
+    batch_size=config['default'].ORDER_INGEST_BATCH_SIZE,
+)
+
+
+class QueueFullError(Exception):
+    """下单队列已满"""
+
+
+def submit_order(user_id, items, table_id=None, remark="", status="pending", shop_id=1, notify_user_id=None):
+    """把已校验的订单放入写入队列，返回临时单号
+
+    写入线程未运行时返回 None，由调用方同步下单；队列已满时抛出 QueueFullError。
+    """
+    if not order_queue.running:
+        return None
+    provisional_id = uuid.uuid4().hex
+    _results.set(provisional_id, {'status': 'queued'})
+    accepted = order_queue.submit({
+        'provisional_id': provisional_id,
+        'user_id': user_id,
+        'items': items,
+        'table_id': table_id,
+        'remark': remark,
+        'status': status,
+        'shop_id': shop_id,
+        'notify_user_id': notify_user_id,
+    })
+    if not accepted:
+        _results.delete(provisional_id)
+        raise QueueFullError()
+    return provisional_id
+
+
+def get_result(provisional_id):
+    """查询临时单号的落库结果，未知（过期或非本进程受理）返回 None"""
+    return _results.get(provisional_id)
+
+
+def ingest_enabled():
+    return config['default'].ORDER_INGEST_ENABLED
@@ -1,7 +1,142 @@
-from models.database import get_db_connection
+from models.database import get_db_connection, call_after_commit
+from utils.http_cache import bump_version
+from utils.pubsub import hub, shop_orders_channel
 from datetime import datetime, timedelta
 
 class OrderModel:
+    @staticmethod
+    def publish_event(shop_id, event_type, data):
+        """事务提交后向店铺订单流推送事件（order_created / order_status）"""
+        call_after_commit(lambda: hub.publish(shop_orders_channel(shop_id or 1), event_type, data))
+
+    @staticmethod
+    def _write_order(cursor, user_id, items, table_id=None, remark="", status="paid", shop_id=1, sales=None):
+        """在调用方的事务中写入订单、订单项并累加菜品销量
+
+        返回 (订单信息, 订单流事件)，没有有效商品时返回 (None, None)；
+        调用方提交后再执行 OrderModel._after_order_committed。
+        传入 sales 字典时只在写入成功后把销量累计到其中，由调用方合并多笔订单后统一 _add_sales。
+        """
+        lines = []
+        total_amount = 0.0
+        total_quantity = 0
+        for item in items:
+            qty = int(item.get('quantity', 1))
+            price = float(item.get('price', 0))
+            lines.append((item.get('dish_id'), qty, price))
+            total_amount += qty * price
+            total_quantity += qty
+
+        if total_quantity == 0:
+            return None, None
+
+        created_at = datetime.now()
+        cursor.execute("""
+            INSERT INTO orders (user_id, shop_id, table_id, total_amount, status, remark, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (user_id, shop_id, table_id, total_amount, status, remark, created_at))
+        order_id = cursor.lastrowid
+
+        # 订单项一条多行 INSERT
+        cursor.executemany("""
+            INSERT INTO order_items (order_id, dish_id, quantity, price)
+            VALUES (%s, %s, %s, %s)
+        """, [(order_id, dish_id, qty, price) for dish_id, qty, price in lines])
+
+        order_sales = {}
+        for dish_id, qty, _ in lines:
+            order_sales[dish_id] = order_sales.get(dish_id, 0) + qty
+        if sales is None:
+            OrderModel._add_sales(cursor, order_sales)
+        OrderModel._apply_rollups(cursor, shop_id, user_id, created_at, status, total_amount, lines)
+        if sales is not None:
+            # 全部写入成功后才并入调用方的销量，中途失败回滚到保存点时不会多记
+            for dish_id, qty in order_sales.items():
+                sales[dish_id] = sales.get(dish_id, 0) + qty
+
+        order = {
+            'order_id': order_id,
+            'total_amount': round(total_amount, 2),
+            'status': status,
+            'item_count': total_quantity,
+            'created_at': created_at.isoformat()
+        }
+        event = {
+            **order,
+            'shop_id': shop_id,
+            'table_id': table_id,
+            'remark': remark,
+            'items': [{'dish_id': dish_id, 'quantity': qty, 'price': price} for dish_id, qty, price in lines]
+        }
+        return order, event
+
+    @staticmethod
+    def _add_sales(cursor, sales):
+        """一条 UPDATE ... CASE 累加多个菜品的销量；按 id 排序加锁，避免并发下单死锁"""
+        if not sales:
+            return
+        dish_ids = sorted(sales)
+        cursor.execute(
+            "UPDATE dishes SET sales = sales + CASE id "
+            + " ".join(["WHEN %s THEN %s"] * len(dish_ids))
+            + f" ELSE 0 END WHERE id IN ({', '.join(['%s'] * len(dish_ids))})",
+            [v for dish_id in dish_ids for v in (dish_id, sales[dish_id])] + dish_ids
+        )
+
+    @staticmethod
+    def _apply_rollups(cursor, shop_id, user_id, created_at, status, total_amount, lines, sign=1):
+        """增量维护按天/按小时的店铺、菜品销售汇总，sign=-1 时从该状态中扣除
+
+        lines: [(dish_id, quantity, price)]；日汇总按下单用户拆分，匿名订单的 user_id 记为 0。
+        """
+        shop_id = shop_id or 1
+        sale_date = created_at.date()
+        sale_hour = created_at.replace(minute=0, second=0, microsecond=0)
+        uid = user_id or 0
+        revenue = round(sign * float(total_amount), 2)
+        cursor.execute("""
+            INSERT INTO shop_daily_sales (shop_id, sale_date, status, user_id, order_count, revenue)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE order_count = order_count + VALUES(order_count),
+                                    revenue = revenue + VALUES(revenue)
+        """, (shop_id, sale_date, status, uid, sign, revenue))
+        cursor.execute("""
+            INSERT INTO shop_hourly_sales (shop_id, sale_hour, status, order_count, revenue)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE order_count = order_count + VALUES(order_count),
+                                    revenue = revenue + VALUES(revenue)
+        """, (shop_id, sale_hour, status, sign, revenue))
+
+        dishes = {}
+        for dish_id, qty, price in lines:
+            quantity, dish_revenue = dishes.get(dish_id, (0, 0.0))
+            dishes[dish_id] = (quantity + qty, dish_revenue + qty * price)
+        if not dishes:
+            return
+        # 与 _add_sales 一样按菜品 id 顺序加锁
+        dish_rows = [
+            (dish_id, sign * dishes[dish_id][0], round(sign * dishes[dish_id][1], 2))
+            for dish_id in sorted(dishes)
+        ]
+        cursor.executemany("""
+            INSERT INTO dish_daily_sales (dish_id, sale_date, status, user_id, shop_id, quantity, revenue)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity),
+                                    revenue = revenue + VALUES(revenue)
+        """, [(dish_id, sale_date, status, uid, shop_id, qty, rev) for dish_id, qty, rev in dish_rows])
+        cursor.executemany("""
+            INSERT INTO dish_hourly_sales (dish_id, sale_hour, status, shop_id, quantity, revenue)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity),
+                                    revenue = revenue + VALUES(revenue)
+        """, [(dish_id, sale_hour, status, shop_id, qty, rev) for dish_id, qty, rev in dish_rows])
+
+    @staticmethod
+    def _after_order_committed(event):
+        """订单提交后：店铺统计缓存失效、推送订单流"""
+        call_after_commit(lambda: bump_version('shop'))
+        OrderModel.publish_event(event['shop_id'], 'order_created', event)
+
     @staticmethod
     def create_from_items(user_id, items, table_id=None, remark="", status="paid", shop_id=1):
         """
@@ -11,54 +146,14 @@ class OrderModel:
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
-                # 计算总价
-                total_amount = 0.0
-                total_quantity = 0
-                for item in items:
-                    qty = int(item.get('quantity', 1))
-                    price = float(item.get('price', 0))
-                    total_amount += qty * price
-                    total_quantity += qty
-
-                if total_quantity == 0:
+                order, event = OrderModel._write_order(
+                    cursor, user_id, items, table_id=table_id, remark=remark, status=status, shop_id=shop_id
+                )
+                if order is None:
                     return None
-
-                # 创建订单
-                sql_order = """
-                    INSERT INTO orders (user_id, shop_id, table_id, total_amount, status, remark, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """
-                cursor.execute(sql_order, (user_id, shop_id, table_id, total_amount, status, remark, datetime.now()))
-                order_id = cursor.lastrowid
-
-                # 创建订单项
-                sql_item = """
-                    INSERT INTO order_items (order_id, dish_id, quantity, price)
-                    VALUES (%s, %s, %s, %s)
-                """
-                for item in items:
-                    cursor.execute(sql_item, (
-                        order_id,
-                        item.get('dish_id'),
-                        int(item.get('quantity', 1)),
-                        float(item.get('price', 0))
-                    ))
-
-                    # 更新菜品销量
-                    cursor.execute(
-                        "UPDATE dishes SET sales = sales + %s WHERE id = %s",
-                        (int(item.get('quantity', 1)), item.get('dish_id'))
-                    )
-
                 connection.commit()
-
-                return {
-                    'order_id': order_id,
-                    'total_amount': round(total_amount, 2),
-                    'status': status,
-                    'item_count': total_quantity,
-                    'created_at': datetime.now().isoformat()
-                }
+                OrderModel._after_order_committed(event)
+                return order
         except Exception:
             connection.rollback()
             raise
@@ -67,18 +162,43 @@ class OrderModel:
 
     @staticmethod
     def update_status(order_id, status, user_id=None):
-        """更新订单状态，可选校验所属用户"""
+        """更新订单状态，可选校验所属用户；同时把销售汇总从原状态移到新状态"""
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
+                sql = """
+                    SELECT user_id, shop_id, table_id, status, total_amount, created_at
+                    FROM orders WHERE id = %s
+                """
+                params = [order_id]
                 if user_id:
-                    sql = "UPDATE orders SET status = %s WHERE id = %s AND user_id = %s"
-                    cursor.execute(sql, (status, order_id, user_id))
-                else:
-                    sql = "UPDATE orders SET status = %s WHERE id = %s"
-                    cursor.execute(sql, (status, order_id))
+                    sql += " AND user_id = %s"
+                    params.append(user_id)
+                cursor.execute(sql + " FOR UPDATE", params)
+                order = cursor.fetchone()
+                if not order or order['status'] == status:
+                    return False
+
+                cursor.execute("UPDATE orders SET status = %s WHERE id = %s", (status, order_id))
+                cursor.execute("SELECT dish_id, quantity, price FROM order_items WHERE order_id = %s", (order_id,))
+                lines = [(row['dish_id'], int(row['quantity']), float(row['price'])) for row in cursor.fetchall()]
+                # 两个状态的汇总行按固定顺序更新，避免相反方向的状态变更互相等锁
+                for row_status, sign in sorted([(order['status'], -1), (status, 1)]):
+                    OrderModel._apply_rollups(
+                        cursor, order['shop_id'], order['user_id'], order['created_at'],
+                        row_status, order['total_amount'], lines, sign=sign
+                    )
                 connection.commit()
-                return cursor.rowcount > 0
+                call_after_commit(lambda: bump_version('shop'))
+                OrderModel.publish_event(order['shop_id'], 'order_status', {
+                    'order_id': order_id,
+                    'status': status,
+                    'table_id': order['table_id']
+                })
+                return True
+        except Exception:
+            connection.rollback()
+            raise
         finally:
             connection.close()
 
@@ -88,30 +208,29 @@ class OrderModel:
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
-                # 获取总销售额和总销售数量
+                # 总销售额和总销售数量直接从日汇总表累加
                 sql_total = """
-                    SELECT 
-                        COALESCE(SUM(o.total_amount), 0) as total_revenue,
-                        COALESCE(SUM(oi.quantity), 0) as total_quantity
-                    FROM orders o
-                    LEFT JOIN order_items oi ON o.id = oi.order_id
-                    WHERE o.user_id = %s AND o.status = 'completed'
+                    SELECT
+                        (SELECT COALESCE(SUM(revenue), 0) FROM shop_daily_sales
+                         WHERE user_id = %s AND status = 'completed') as total_revenue,
+                        (SELECT COALESCE(SUM(quantity), 0) FROM dish_daily_sales
+                         WHERE user_id = %s AND status = 'completed') as total_quantity
                 """
-                cursor.execute(sql_total, (user_id,))
+                cursor.execute(sql_total, (user_id, user_id))
                 total_stats = cursor.fetchone()
-                
+
                 # 获取销售最多的菜品
                 sql_top_dish = """
                     SELECT 
                         d.id,
                         d.name,
                         d.image_url,
-                        SUM(oi.quantity) as total_sold
-                    FROM order_items oi
-                    JOIN orders o ON oi.order_id = o.id
-                    JOIN dishes d ON oi.dish_id = d.id
-                    WHERE o.user_id = %s AND o.status = 'completed'
+                        SUM(r.quantity) as total_sold
+                    FROM dish_daily_sales r
+                    JOIN dishes d ON r.dish_id = d.id
+                    WHERE r.user_id = %s AND r.status = 'completed'
                     GROUP BY d.id, d.name, d.image_url
+                    HAVING total_sold > 0
                     ORDER BY total_sold DESC
                     LIMIT 1
                 """
@@ -1,19 +1,39 @@
 """帖子数据模型"""
+import threading
+import uuid
+from datetime import datetime
+
 from .database import get_db_connection
 from models.user_model import UserModel
+from utils.pagination import encode_cursor, decode_cursor
+from config import config
+
+# 粉丝数超过该值的作者发帖不再写扩散，由粉丝读取时拉取
+FEED_FANOUT_MAX_FOLLOWERS = config['default'].FEED_FANOUT_MAX_FOLLOWERS
+
+# "推荐"热度榜快照：后台任务定期重算，保留上一版供正在翻页的游标继续使用
+# 版本号带进程标识，多进程部署时其他进程签发的游标不会误用本进程的快照
+_BOOT_ID = uuid.uuid4().hex[:8]
+_hot_ranking_lock = threading.Lock()
+_hot_rankings = {}          # version -> {'ids': [post_id, ...], 'boundary': (created_at, id)}
+_hot_ranking_version = None
+_hot_ranking_counter = 0
 
 
 class PostModel:
     """帖子模型"""
 
     @staticmethod
-    def get_list(page=1, limit=10, category="推荐", current_user_id=None, following_ids=None):
-        """获取帖子列表"""
+    def get_list(page=1, limit=10, category="推荐", current_user_id=None, following_ids=None,
+                 page_cursor=None):
+        """获取帖子列表
+
+        page_cursor 不为 None 时使用游标分页（空字符串表示第一页），返回 next_cursor，不统计总数；
+        否则沿用 page/limit 分页。
+        """
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
-                offset = (page - 1) * limit
-                
                 # 构建查询条件
                 where_clauses = []
                 params = []
@@ -23,6 +43,8 @@ class PostModel:
                     # following_ids为None表示用户未登录，为[]表示没有关注任何人
                     if following_ids is None or len(following_ids) == 0:
                         # 没有关注任何人，返回空列表
+                        if page_cursor is not None:
+                            return {'posts': [], 'limit': limit, 'next_cursor': None, 'has_more': False}
                         return {
                             'posts': [],
                             'total': 0,
@@ -35,70 +57,116 @@ class PostModel:
                         where_clauses.append(f"p.user_id IN ({placeholders})")
                         params.extend(following_ids)
                 
-                where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
-                
-                # 获取帖子列表
-                sql = f"""
-                    SELECT p.id, p.user_id, p.title, p.content, p.image_urls, 
-                           p.likes, p.comment_count, p.created_at,
-                           u.username, u.avatar
-                    FROM posts p
-                    JOIN users u ON p.user_id = u.id
-                    {where_sql}
-                    ORDER BY p.created_at DESC
-                    LIMIT %s OFFSET %s
-                """
-                params.extend([limit, offset])
-                cursor.execute(sql, params)
-                posts = cursor.fetchall()
-                
-                # 获取总数
-                count_sql = f"SELECT COUNT(*) as total FROM posts p {where_sql}"
-                cursor.execute(count_sql, params[:-2])  # 去掉limit和offset参数
-                total = cursor.fetchone()['total']
-                
-                # 格式化帖子数据
-                formatted_posts = []
-                for post in posts:
-                    # 解析图片URLs
-                    image_urls = post.get('image_urls', '') or ''
-                    images = [url.strip() for url in image_urls.split(',') if url.strip()]
-                    
-                    # 检查当前用户是否点赞
-                    is_liked = False
-                    if current_user_id:
-                        like_sql = "SELECT id FROM post_likes WHERE user_id = %s AND post_id = %s"
-                        cursor.execute(like_sql, (current_user_id, post['id']))
-                        is_liked = cursor.fetchone() is not None
-                    
-                    formatted_post = {
-                        'id': post['id'],
-                        'user_id': post['user_id'],
-                        'username': post['username'],
-                        'avatar': post.get('avatar', ''),
-                        'content': post['content'],
-                        'title': post.get('title', ''),
-                        'imageUrls': image_urls,
-                        'images': images,
-                        'videos': [],  # 暂时不支持视频
-                        'likeCount': post.get('likes', 0),
-                        'commentCount': post.get('comment_count', 0),
-                        'isLiked': is_liked,
-                        'isFollowed': False,  # 将在API层设置
-                        'createTime': int(post['created_at'].timestamp()) if post.get('created_at') else 0
-                    }
-                    formatted_posts.append(formatted_post)
+                if page_cursor is not None:
+                    posts, meta = PostModel._fetch_page_by_cursor(cursor, where_clauses, params, limit, page_cursor)
+                else:
+                    posts, meta = PostModel._fetch_page_by_offset(cursor, where_clauses, params, page, limit)
                 
-                return {
-                    'posts': formatted_posts,
-                    'total': total,
-                    'page': page,
-                    'limit': limit,
-                    'pages': (total + limit - 1) // limit if limit else 1
-                }
+                formatted_posts = PostModel._format_feed_posts(cursor, posts, current_user_id)
+                return {'posts': formatted_posts, **meta}
         finally:
             connection.close()
 
+    @staticmethod
+    def _format_feed_posts(cursor, posts, current_user_id=None):
+        """格式化帖子流数据，点赞状态一次查询整页"""
+        liked_ids = set()
+        if current_user_id and posts:
+            liked_ids = PostModel._fetch_liked_ids(cursor, current_user_id, [p['id'] for p in posts])
+        
+        formatted_posts = []
+        for post in posts:
+            # 解析图片URLs
+            image_urls = post.get('image_urls', '') or ''
+            images = [url.strip() for url in image_urls.split(',') if url.strip()]
+            
+            formatted_post = {
+                'id': post['id'],
+                'user_id': post['user_id'],
+                'username': post['username'],
+                'avatar': post.get('avatar', ''),
+                'content': post['content'],
+                'title': post.get('title', ''),
+                'imageUrls': image_urls,
+                'images': images,
+                'videos': [],  # 暂时不支持视频
+                'likeCount': post.get('likes', 0),
+                'commentCount': post.get('comment_count', 0),
+                'isLiked': post['id'] in liked_ids,
+                'isFollowed': False,  # 将在API层设置
+                'createTime': int(post['created_at'].timestamp()) if post.get('created_at') else 0
+            }
+            formatted_posts.append(formatted_post)
+        return formatted_posts
+
+    @staticmethod
+    def _fetch_page_by_offset(cursor, where_clauses, params, page, limit):
+        """page/limit 分页（兼容旧客户端），附带总数"""
+        offset = (page - 1) * limit
+        where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        
+        sql = f"""
+            SELECT p.id, p.user_id, p.title, p.content, p.image_urls, 
+                   p.likes, p.comment_count, p.created_at,
+                   u.username, u.avatar
+            FROM posts p
+            JOIN users u ON p.user_id = u.id
+            {where_sql}
+            ORDER BY p.created_at DESC, p.id DESC
+            LIMIT %s OFFSET %s
+        """
+        cursor.execute(sql, list(params) + [limit, offset])
+        posts = cursor.fetchall()
+        
+        # 获取总数
+        count_sql = f"SELECT COUNT(*) as total FROM posts p {where_sql}"
+        cursor.execute(count_sql, params)
+        total = cursor.fetchone()['total']
+        
+        return posts, {
+            'total': total,
+            'page': page,
+            'limit': limit,
+            'pages': (total + limit - 1) // limit if limit else 1
+        }
+
+    @staticmethod
+    def _fetch_page_by_cursor(cursor, where_clauses, params, limit, page_cursor):
+        """按 (created_at, id) 游标分页，走 (created_at, id) 复合索引，不统计总数"""
+        where_clauses = list(where_clauses)
+        params = list(params)
+        if page_cursor:
+            created_at, post_id = decode_cursor(page_cursor, 2)
+            where_clauses.append("(p.created_at < %s OR (p.created_at = %s AND p.id < %s))")
+            params.extend([created_at, created_at, post_id])
+        where_sql = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        
+        sql = f"""
+            SELECT p.id, p.user_id, p.title, p.content, p.image_urls, 
+                   p.likes, p.comment_count, p.created_at,
+                   u.username, u.avatar
+            FROM posts p
+            JOIN users u ON p.user_id = u.id
+            {where_sql}
+            ORDER BY p.created_at DESC, p.id DESC
+            LIMIT %s
+        """
+        cursor.execute(sql, params + [limit + 1])
+        posts = cursor.fetchall()
+        
+        has_more = len(posts) > limit
+        posts = posts[:limit]
+        next_cursor = None
+        if has_more and posts:
+            last = posts[-1]
+            next_cursor = encode_cursor(last['created_at'], last['id'])
+        
+        return posts, {
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }
+
     @staticmethod
     def create(user_id, title, content, image_urls=""):
         """创建帖子"""
@@ -110,14 +178,282 @@ class PostModel:
                     VALUES (%s, %s, %s, %s)
                 """
                 cursor.execute(sql, (user_id, title, content, image_urls))
+                post_id = cursor.lastrowid
+                PostModel._fan_out(cursor, user_id, post_id)
                 connection.commit()
-                return PostModel.get_by_id(cursor.lastrowid)
+                return PostModel.get_by_id(post_id)
         except Exception as e:
             connection.rollback()
             raise e
         finally:
             connection.close()
 
+    @staticmethod
+    def _fan_out(cursor, author_id, post_id):
+        """写扩散：把新帖推入所有粉丝的时间线；粉丝过多的作者改为读时拉取"""
+        cursor.execute("SELECT COUNT(*) as total FROM follows WHERE following_id = %s", (author_id,))
+        follower_count = cursor.fetchone()['total']
+        if follower_count > FEED_FANOUT_MAX_FOLLOWERS:
+            cursor.execute("INSERT IGNORE INTO feed_pull_authors (user_id) VALUES (%s)", (author_id,))
+            return
+        if follower_count == 0:
+            return
+        sql = """
+            INSERT IGNORE INTO feed_timeline (user_id, post_id, author_id, created_at)
+            SELECT f.follower_id, p.id, p.user_id, p.created_at
+            FROM follows f
+            JOIN posts p ON p.id = %s
+            WHERE f.following_id = %s
+        """
+        cursor.execute(sql, (post_id, author_id))
+
+    @staticmethod
+    def get_following_feed(user_id, page=1, limit=10, page_cursor=None):
+        """"关注"帖子流：读取本人时间线，并合并大V作者（读时拉取）的帖子"""
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                # 关注的作者中需要读时拉取的部分
+                cursor.execute("""
+                    SELECT f.following_id FROM follows f
+                    JOIN feed_pull_authors a ON a.user_id = f.following_id
+                    WHERE f.follower_id = %s
+                """, (user_id,))
+                pull_author_ids = [row['following_id'] for row in cursor.fetchall()]
+                
+                timeline_clause = ""
+                posts_clause = ""
+                cursor_params = []
+                if page_cursor:
+                    created_at, post_id = decode_cursor(page_cursor, 2)
+                    timeline_clause = " AND (created_at < %s OR (created_at = %s AND post_id < %s))"
+                    posts_clause = " AND (created_at < %s OR (created_at = %s AND id < %s))"
+                    cursor_params = [created_at, created_at, post_id]
+                fetch_count = limit + 1 if page_cursor is not None else page * limit
+                
+                # 时间线区间读取
+                cursor.execute(f"""
+                    SELECT post_id AS id, created_at FROM feed_timeline
+                    WHERE user_id = %s{timeline_clause}
+                    ORDER BY created_at DESC, post_id DESC
+                    LIMIT %s
+                """, [user_id] + cursor_params + [fetch_count])
+                entries = {row['id']: row for row in cursor.fetchall()}
+                
+                if pull_author_ids:
+                    placeholders = ', '.join(['%s'] * len(pull_author_ids))
+                    cursor.execute(f"""
+                        SELECT id, created_at FROM posts
+                        WHERE user_id IN ({placeholders}){posts_clause}
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    """, pull_author_ids + cursor_params + [fetch_count])
+                    for row in cursor.fetchall():
+                        entries.setdefault(row['id'], row)
+                
+                ordered = sorted(entries.values(), key=lambda r: (r['created_at'], r['id']), reverse=True)
+                
+                if page_cursor is not None:
+                    has_more = len(ordered) > limit
+                    window = ordered[:limit]
+                    meta = {
+                        'limit': limit,
+                        'next_cursor': encode_cursor(window[-1]['created_at'], window[-1]['id']) if has_more else None,
+                        'has_more': has_more
+                    }
+                else:
+                    window = ordered[(page - 1) * limit:page * limit]
+                    cursor.execute("SELECT COUNT(*) as total FROM feed_timeline WHERE user_id = %s", (user_id,))
+                    total = cursor.fetchone()['total']
+                    if pull_author_ids:
+                        # 大V帖子中已写入时间线的部分（成为大V之前发布的）不重复计数
+                        cursor.execute(f"""
+                            SELECT COUNT(*) as total FROM posts p
+                            WHERE p.user_id IN ({placeholders})
+                              AND NOT EXISTS (SELECT 1 FROM feed_timeline t WHERE t.user_id = %s AND t.post_id = p.id)
+                        """, pull_author_ids + [user_id])
+                        total += cursor.fetchone()['total']
+                    meta = {
+                        'total': total,
+                        'page': page,
+                        'limit': limit,
+                        'pages': (total + limit - 1) // limit if limit else 1
+                    }
+                
+                posts = PostModel._fetch_posts_by_ids(cursor, [row['id'] for row in window])
+                formatted_posts = PostModel._format_feed_posts(cursor, posts, user_id)
+                return {'posts': formatted_posts, **meta}
+        finally:
+            connection.close()
+
+    @staticmethod
+    def refresh_hot_ranking():
+        """重算"推荐"热度榜（后台任务）
+
+        热度 = (点赞 + 2 × 评论 + 1) / (发布小时数 + 2) ^ gravity，只考虑最近 FEED_RANK_WINDOW_DAYS 天的帖子。
+        boundary 记录参与排名的最旧帖子，榜单翻完后从它之后按时间倒序继续。
+        """
+        global _hot_ranking_version, _hot_ranking_counter
+        db_config = config['default']
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                sql = """
+                    SELECT id, likes, comment_count, created_at
+                    FROM posts
+                    WHERE created_at >= NOW() - INTERVAL %s DAY
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                """
+                cursor.execute(sql, (db_config.FEED_RANK_WINDOW_DAYS, db_config.FEED_RANK_MAX_POSTS))
+                rows = cursor.fetchall()
+        finally:
+            connection.close()
+        
+        now = datetime.now()
+        gravity = db_config.FEED_RANK_GRAVITY
+        scored = []
+        for row in rows:
+            age_hours = max(0.0, (now - row['created_at']).total_seconds() / 3600) if row.get('created_at') else 0.0
+            points = (row.get('likes') or 0) + 2 * (row.get('comment_count') or 0) + 1
+            scored.append((points / (age_hours + 2) ** gravity, row['id']))
+        scored.sort(reverse=True)
+        
+        boundary = (rows[-1]['created_at'], rows[-1]['id']) if rows else None
+        
+        with _hot_ranking_lock:
+            previous = _hot_ranking_version
+            _hot_ranking_counter += 1
+            _hot_ranking_version = f'{_BOOT_ID}-{_hot_ranking_counter}'
+            _hot_rankings[_hot_ranking_version] = {
+                'ids': [post_id for _, post_id in scored],
+                'boundary': boundary
+            }
+            for version in [v for v in _hot_rankings if v not in (previous, _hot_ranking_version)]:
+                del _hot_rankings[version]
+        return len(scored)
+
+    @staticmethod
+    def get_recommend_feed(page=1, limit=10, current_user_id=None, page_cursor=None):
+        """"推荐"帖子流：先按预先计算的热度榜翻页，榜单翻完后接着按时间倒序返回更早的帖子
+
+        榜单尚未生成时退回按时间倒序。游标分页时榜单阶段的游标为 ("rank", 版本, 偏移)，
+        进入时间倒序阶段后返回与 get_list 相同的时间游标。
+        游标对应的榜单快照已被替换（或来自其他进程）时从新榜单第一页重新开始，并返回 reset=True，
+        客户端应清空已加载的列表。
+        """
+        offset = 0
+        reset = False
+        if page_cursor:
+            try:
+                kind, cursor_version, offset = decode_cursor(page_cursor, 3)
+            except ValueError:
+                kind = None
+            if kind != 'rank':
+                # 时间游标：榜单之后的更早帖子，或榜单生成前开始的时间倒序翻页
+                return PostModel.get_list(page=page, limit=limit, category="推荐",
+                                          current_user_id=current_user_id, page_cursor=page_cursor)
+            offset = int(offset)
+
+        with _hot_ranking_lock:
+            version = _hot_ranking_version
+            snapshot = _hot_rankings.get(version)
+            # 翻页途中榜单已重算时继续使用旧快照，避免重复或漏帖；旧快照也已淘汰则从头开始
+            if page_cursor:
+                if cursor_version in _hot_rankings:
+                    version = cursor_version
+                    snapshot = _hot_rankings[version]
+                else:
+                    offset = 0
+                    reset = True
+
+        if not snapshot or not snapshot['ids']:
+            result = PostModel.get_list(page=page, limit=limit, category="推荐",
+                                        current_user_id=current_user_id,
+                                        page_cursor='' if page_cursor is not None else None)
+            if page_cursor is not None:
+                result['reset'] = reset
+            return result
+
+        ranked = snapshot['ids']
+        created_at, post_id = snapshot['boundary']
+        older_clause = "(p.created_at < %s OR (p.created_at = %s AND p.id < %s))"
+        older_params = [created_at, created_at, post_id]
+
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                if page_cursor is not None:
+                    posts = PostModel._fetch_posts_by_ids(cursor, ranked[offset:offset + limit])
+                    if offset + limit < len(ranked):
+                        meta = {
+                            'limit': limit,
+                            'next_cursor': encode_cursor('rank', version, offset + limit),
+                            'has_more': True,
+                            'reset': reset
+                        }
+                    else:
+                        # 榜单翻完：不足一页的部分从参与排名的最旧帖子之后补齐
+                        older, older_meta = PostModel._fetch_page_by_cursor(
+                            cursor, [], [], limit - len(posts), encode_cursor(created_at, post_id)
+                        )
+                        posts += older
+                        next_cursor = older_meta['next_cursor']
+                        if older_meta['has_more'] and not older:
+                            next_cursor = encode_cursor(created_at, post_id)
+                        meta = {
+                            'limit': limit,
+                            'next_cursor': next_cursor,
+                            'has_more': older_meta['has_more'],
+                            'reset': reset
+                        }
+                else:
+                    start = (page - 1) * limit
+                    posts = PostModel._fetch_posts_by_ids(cursor, ranked[start:start + limit])
+                    remaining = limit - len(ranked[start:start + limit])
+                    if remaining > 0:
+                        cursor.execute(f"""
+                            SELECT p.id, p.user_id, p.title, p.content, p.image_urls, 
+                                   p.likes, p.comment_count, p.created_at,
+                                   u.username, u.avatar
+                            FROM posts p
+                            JOIN users u ON p.user_id = u.id
+                            WHERE {older_clause}
+                            ORDER BY p.created_at DESC, p.id DESC
+                            LIMIT %s OFFSET %s
+                        """, older_params + [remaining, max(0, start - len(ranked))])
+                        posts += cursor.fetchall()
+                    cursor.execute(f"SELECT COUNT(*) as total FROM posts p WHERE {older_clause}", older_params)
+                    total = len(ranked) + cursor.fetchone()['total']
+                    meta = {
+                        'total': total,
+                        'page': page,
+                        'limit': limit,
+                        'pages': (total + limit - 1) // limit if limit else 1
+                    }
+                formatted_posts = PostModel._format_feed_posts(cursor, posts, current_user_id)
+                return {'posts': formatted_posts, **meta}
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _fetch_posts_by_ids(cursor, post_ids):
+        """按给定ID顺序批量获取帖子"""
+        if not post_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        sql = f"""
+            SELECT p.id, p.user_id, p.title, p.content, p.image_urls, 
+                   p.likes, p.comment_count, p.created_at,
+                   u.username, u.avatar
+            FROM posts p
+            JOIN users u ON p.user_id = u.id
+            WHERE p.id IN ({placeholders})
+        """
+        cursor.execute(sql, list(post_ids))
+        rows = {row['id']: row for row in cursor.fetchall()}
+        return [rows[pid] for pid in post_ids if pid in rows]
+
     @staticmethod
     def get_by_id(post_id):
         """根据ID获取帖子"""
@@ -206,31 +542,17 @@ class PostModel:
             connection.close()
 
     @staticmethod
-    def get_by_user_id(user_id, page=1, limit=10):
-        """获取指定用户的帖子列表"""
+    def get_by_user_id(user_id, page=1, limit=10, page_cursor=None):
+        """获取指定用户的帖子列表（page_cursor 不为 None 时使用游标分页）"""
         connection = get_db_connection()
         try:
             with connection.cursor() as cursor:
-                offset = (page - 1) * limit
-                
-                # 获取用户帖子列表
-                sql = """
-                    SELECT p.id, p.user_id, p.title, p.content, p.image_urls, 
-                           p.likes, p.comment_count, p.created_at,
-                           u.username, u.avatar
-                    FROM posts p
-                    JOIN users u ON p.user_id = u.id
-                    WHERE p.user_id = %s
-                    ORDER BY p.created_at DESC
-                    LIMIT %s OFFSET %s
-                """
-                cursor.execute(sql, (user_id, limit, offset))
-                posts = cursor.fetchall()
-                
-                # 获取总数
-                count_sql = "SELECT COUNT(*) as total FROM posts WHERE user_id = %s"
-                cursor.execute(count_sql, (user_id,))
-                total = cursor.fetchone()['total']
+                where_clauses = ["p.user_id = %s"]
+                params = [user_id]
+                if page_cursor is not None:
+                    posts, meta = PostModel._fetch_page_by_cursor(cursor, where_clauses, params, limit, page_cursor)
+                else:
+                    posts, meta = PostModel._fetch_page_by_offset(cursor, where_clauses, params, page, limit)
                 
                 # 格式化帖子数据
                 formatted_posts = []
@@ -256,13 +578,18 @@ class PostModel:
                     }
                     formatted_posts.append(formatted_post)
                 
-                return {
-                    'posts': formatted_posts,
-                    'total': total,
-                    'page': page,
-                    'limit': limit,
-                    'pages': (total + limit - 1) // limit if limit else 1
-                }
+                return {'posts': formatted_posts, **meta}
         finally:
             connection.close()
 
+    @staticmethod
+    def _fetch_liked_ids(cursor, user_id, post_ids):
+        """在给定游标上查询用户点赞过的帖子ID集合"""
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        sql = f"""
+            SELECT post_id FROM post_likes 
+            WHERE user_id = %s AND post_id IN ({placeholders})
+        """
+        cursor.execute(sql, [user_id] + list(post_ids))
+        return {row['post_id'] for row in cursor.fetchall()}
+
@@ -0,0 +1,137 @@
+"""销售分析数据模型（读取 OrderModel 维护的销售汇总表）"""
+from datetime import datetime, timedelta
+
+from config import config
+from utils import timeseries
+from .database import get_db_connection
+from .dish_model import DishModel
+
+# 计入销售额的订单状态（不含待支付和已取消）
+SALES_STATUSES = ('paid', 'confirmed', 'preparing', 'completed')
+GROUP_BY_OPTIONS = ('total', 'dish', 'category')
+
+
+class SalesModel:
+    """销售分析模型"""
+
+    @staticmethod
+    def _fetch_rows(shop_id, start, end, bucket, group_by, statuses):
+        """从汇总表取出 (时间, 菜品, 数量, 销售额) 行；小时粒度读小时汇总，其余读日汇总"""
+        hourly = bucket == 'hour'
+        level = 'hourly' if hourly else 'daily'
+        if group_by == 'total':
+            table, key_column, count_column = f'shop_{level}_sales', 'shop_id', 'order_count'
+        else:
+            table, key_column, count_column = f'dish_{level}_sales', 'dish_id', 'quantity'
+        time_column = 'sale_hour' if hourly else 'sale_date'
+        sql = f"""
+            SELECT {time_column} AS t, {key_column} AS k,
+                   SUM({count_column}) AS count, SUM(revenue) AS revenue
+            FROM {table}
+            WHERE shop_id = %s AND {time_column} >= %s AND {time_column} < %s
+              AND status IN ({', '.join(['%s'] * len(statuses))})
+            GROUP BY {time_column}, {key_column}
+        """
+        lower, upper = start, end + timedelta(days=1)
+        if hourly:
+            lower = datetime(lower.year, lower.month, lower.day)
+            upper = datetime(upper.year, upper.month, upper.day)
+        params = (shop_id, lower, upper, *statuses)
+
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def get_timeseries(shop_id, start, end, bucket='day', group_by='total',
+                       statuses=SALES_STATUSES, limit=20):
+        """按小时/天/周分桶的销售序列
+
+        group_by=total 返回订单数和销售额；dish/category 返回各菜品/分类的销量和销售额，
+        按总销售额降序取前 limit 个。缺失的桶补 0。
+        """
+        rows = SalesModel._fetch_rows(shop_id, start, end, bucket, group_by, statuses)
+        n_buckets = timeseries.bucket_count(bucket, start, end)
+
+        count_name = 'orders' if group_by == 'total' else 'quantity'
+        dish_index = DishModel.get_dish_index() if group_by != 'total' else {}
+        if group_by == 'total':
+            keys = ['total'] * len(rows)
+        elif group_by == 'category':
+            keys = [dish_index.get(row['k'], {}).get('category') or '未分类' for row in rows]
+        else:
+            keys = [row['k'] for row in rows]
+
+        grouped = timeseries.aggregate(
+            bucket, start, n_buckets,
+            [row['t'] for row in rows],
+            keys,
+            {
+                count_name: [int(row['count'] or 0) for row in rows],
+                'revenue': [float(row['revenue'] or 0) for row in rows],
+            }
+        )
+
+        series = []
+        for key, columns in grouped.items():
+            counts = [int(round(value)) for value in columns[count_name]]
+            revenue = [round(value, 2) for value in columns['revenue']]
+            item = {
+                'key': key,
+                'name': key,
+                count_name: counts,
+                'revenue': revenue,
+                f'total_{count_name}': sum(counts),
+                'total_revenue': round(sum(revenue), 2),
+            }
+            if group_by == 'dish':
+                dish = dish_index.get(key) or {}
+                item['name'] = dish.get('name') or f'菜品#{key}'
+                item['category'] = dish.get('category') or '未分类'
+            series.append(item)
+        if group_by == 'total' and not series:
+            series.append({
+                'key': 'total', 'name': 'total',
+                'orders': [0] * n_buckets, 'revenue': [0.0] * n_buckets,
+                'total_orders': 0, 'total_revenue': 0.0,
+            })
+        series.sort(key=lambda item: item['total_revenue'], reverse=True)
+
+        return {
+            'shop_id': shop_id,
+            'bucket': bucket,
+            'group_by': group_by,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'statuses': list(statuses),
+            'buckets': timeseries.bucket_labels(bucket, start, n_buckets),
+            'series': series[:limit] if group_by != 'total' else series,
+            'totals': {
+                count_name: sum(item[f'total_{count_name}'] for item in series),
+                'revenue': round(sum(item['total_revenue'] for item in series), 2),
+            }
+        }
+
+    @staticmethod
+    def purge_hourly_rollups(batch_size=5000):
+        """删除超过 SALES_HOURLY_RETENTION_DAYS 的小时汇总（后台任务），每批单独提交"""
+        cutoff = datetime.now() - timedelta(days=config['default'].SALES_HOURLY_RETENTION_DAYS)
+        deleted = 0
+        for table in ('shop_hourly_sales', 'dish_hourly_sales'):
+            while True:
+                connection = get_db_connection(scoped=False)
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"DELETE FROM {table} WHERE sale_hour < %s LIMIT %s", (cutoff, batch_size))
+                        count = cursor.rowcount
+                        connection.commit()
+                finally:
+                    connection.close()
+                deleted += count
+                if count < batch_size:
+                    break
+        return deleted
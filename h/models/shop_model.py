@@ -1,5 +1,8 @@
 """店铺数据模型"""
-from .database import get_db_connection
+from datetime import date
+
+from utils.http_cache import bump_version
+from .database import get_db_connection, call_after_commit
 
 
 class ShopModel:
@@ -14,14 +17,16 @@ class ShopModel:
                 sql = """
                     SELECT s.id, s.shop_name, s.description, s.address, s.phone, 
                            s.business_hours, s.created_at,
-                           (SELECT COUNT(*) FROM orders o WHERE o.shop_id = s.id 
-                            AND DATE(o.created_at) = CURDATE()) as todayOrders,
-                           (SELECT COALESCE(SUM(total_amount), 0) FROM orders o 
-                            WHERE o.shop_id = s.id AND DATE(o.created_at) = CURDATE()) as todayRevenue
+                           (SELECT COALESCE(SUM(order_count), 0) FROM shop_daily_sales r
+                            WHERE r.shop_id = s.id AND r.sale_date = %s) as todayOrders,
+                           (SELECT COALESCE(SUM(revenue), 0) FROM shop_daily_sales r
+                            WHERE r.shop_id = s.id AND r.sale_date = %s) as todayRevenue
                     FROM shops s
                     WHERE s.id = %s
                 """
-                cursor.execute(sql, (shop_id,))
+                # 汇总行的日期取自应用时钟（OrderModel._apply_rollups），"今天"同样用应用时钟而不是 CURDATE()
+                today = date.today()
+                cursor.execute(sql, (today, today, shop_id))
                 shop = cursor.fetchone()
                 
                 if not shop:
@@ -51,8 +56,8 @@ class ShopModel:
                     'address': shop.get('address', ''),
                     'phone': shop.get('phone', ''),
                     'score': 4.8,  # 默认评分
-                    'todayOrders': shop.get('todayOrders', 0),
-                    'todayRevenue': float(shop.get('todayRevenue', 0)),
+                    'todayOrders': int(shop.get('todayOrders') or 0),
+                    'todayRevenue': float(shop.get('todayRevenue') or 0),
                     'latitude': 37.5149,  # 默认坐标
                     'longitude': 105.1965
                 }
@@ -89,6 +94,7 @@ class ShopModel:
                     cursor.execute(sql, (shop_id, shop_name, description, address, phone, business_hours))
                 
                 connection.commit()
+                call_after_commit(lambda: bump_version('shop'))
                 return ShopModel.get_info(shop_id)
         except Exception as e:
             connection.rollback()
@@ -1,5 +1,6 @@
 """桌位数据模型"""
-from .database import get_db_connection
+from utils.http_cache import bump_version
+from .database import get_db_connection, call_after_commit
 
 class TableModel:
     """桌位模型"""
@@ -104,6 +105,7 @@ class TableModel:
                 (table_number, table_name or f'{table_number}号桌', capacity)
             )
             conn.commit()
+            call_after_commit(lambda: bump_version('tables'))
             return TableModel.get_by_id(cursor.lastrowid)
         finally:
             conn.close()
@@ -119,6 +121,7 @@ class TableModel:
                 (status, table_id)
             )
             conn.commit()
+            call_after_commit(lambda: bump_version('tables'))
             return TableModel.get_by_id(table_id)
         finally:
             conn.close()
@@ -131,6 +134,7 @@ class TableModel:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM tables_info WHERE id = %s', (table_id,))
             conn.commit()
+            call_after_commit(lambda: bump_version('tables'))
             return cursor.rowcount > 0
         finally:
             conn.close()
@@ -57,6 +57,7 @@ CREATE TABLE IF NOT EXISTS dishes (
   category VARCHAR(100) DEFAULT '',
   is_recommended TINYINT(1) NOT NULL DEFAULT 0,
   status VARCHAR(50) NOT NULL DEFAULT 'available',
+  sales INT NOT NULL DEFAULT 0,             -- 累计销量（下单时增量维护，后台任务定期校准）
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   INDEX idx_shop_id (shop_id),
   CONSTRAINT fk_dishes_shop FOREIGN KEY (shop_id) REFERENCES shops(id) ON DELETE CASCADE
@@ -69,7 +70,7 @@ CREATE TABLE IF NOT EXISTS cart_items (
   quantity INT NOT NULL DEFAULT 1,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP NULL DEFAULT NULL,
-  INDEX idx_user_id (user_id),
+  UNIQUE KEY uk_user_dish (user_id, dish_id),
   INDEX idx_dish_id (dish_id),
   CONSTRAINT fk_cart_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
   CONSTRAINT fk_cart_dish FOREIGN KEY (dish_id) REFERENCES dishes(id) ON DELETE CASCADE
@@ -114,6 +115,8 @@ CREATE TABLE IF NOT EXISTS posts (
   comment_count INT NOT NULL DEFAULT 0,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   INDEX idx_user_id (user_id),
+  INDEX idx_created_id (created_at, id),              -- 帖子流游标分页
+  INDEX idx_user_created_id (user_id, created_at, id), -- 用户主页游标分页
   CONSTRAINT fk_posts_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -145,8 +148,15 @@ CREATE TABLE IF NOT EXISTS conversations (
   user1_id INT NOT NULL,
   user2_id INT NOT NULL,
   updated_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+  last_message_id INT DEFAULT NULL,       -- 最后一条消息（发送消息时维护）
+  last_content TEXT,
+  last_time TIMESTAMP NULL DEFAULT NULL,
+  user1_unread INT NOT NULL DEFAULT 0,    -- user1 的未读消息数
+  user2_unread INT NOT NULL DEFAULT 0,    -- user2 的未读消息数
   INDEX idx_user1 (user1_id),
   INDEX idx_user2 (user2_id),
+  INDEX idx_user1_updated (user1_id, updated_at),
+  INDEX idx_user2_updated (user2_id, updated_at),
   CONSTRAINT fk_conversation_user1 FOREIGN KEY (user1_id) REFERENCES users(id) ON DELETE CASCADE,
   CONSTRAINT fk_conversation_user2 FOREIGN KEY (user2_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -162,7 +172,7 @@ CREATE TABLE IF NOT EXISTS messages (
   voice_duration INT DEFAULT 0,
   is_read TINYINT(1) NOT NULL DEFAULT 0,
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  INDEX idx_conversation_id (conversation_id),
+  INDEX idx_conversation_msg (conversation_id, id),  -- 消息按 id 游标分页
   INDEX idx_sender_id (sender_id),
   CONSTRAINT fk_messages_conversation FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE,
   CONSTRAINT fk_messages_sender FOREIGN KEY (sender_id) REFERENCES users(id) ON DELETE CASCADE
@@ -195,6 +205,25 @@ CREATE TABLE IF NOT EXISTS follows (
   CONSTRAINT fk_follows_following FOREIGN KEY (following_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- 关注帖子流时间线（发帖时写扩散到粉丝）
+CREATE TABLE IF NOT EXISTS feed_timeline (
+  user_id INT NOT NULL,                   -- 时间线所属用户（粉丝）
+  post_id INT NOT NULL,
+  author_id INT NOT NULL,                 -- 帖子作者
+  created_at TIMESTAMP NOT NULL,          -- 帖子发布时间
+  PRIMARY KEY (user_id, post_id),
+  INDEX idx_user_created (user_id, created_at, post_id),
+  INDEX idx_user_author (user_id, author_id),
+  CONSTRAINT fk_timeline_post FOREIGN KEY (post_id) REFERENCES posts(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 粉丝过多、发帖不做写扩散的作者（粉丝读取时拉取）
+CREATE TABLE IF NOT EXISTS feed_pull_authors (
+  user_id INT PRIMARY KEY,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT fk_pull_authors_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 -- 通知表
 CREATE TABLE IF NOT EXISTS notifications (
   id INT AUTO_INCREMENT PRIMARY KEY,
@@ -204,11 +233,89 @@ CREATE TABLE IF NOT EXISTS notifications (
   content TEXT NOT NULL,                  -- 通知内容
   related_id INT DEFAULT NULL,            -- 关联ID（订单ID/消息ID等）
   related_type VARCHAR(50) DEFAULT NULL,  -- 关联类型（order/message/conversation等）
+  group_key VARCHAR(100) DEFAULT NULL,    -- 合并键：同一键的通知在保留策略中只保留最新一条
   is_read TINYINT(1) DEFAULT 0,           -- 是否已读
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  INDEX idx_user_id (user_id),
-  INDEX idx_type (type),
-  INDEX idx_is_read (is_read),
+  INDEX idx_user_created (user_id, created_at),
+  INDEX idx_user_read_created (user_id, is_read, created_at),
+  INDEX idx_user_group (user_id, group_key),
+  INDEX idx_type_created (type, created_at),
   INDEX idx_created_at (created_at),
   CONSTRAINT fk_notifications_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 通知发件箱（NOTIFICATION_OUTBOX_ENABLED 时随业务事务写入，后台批量搬运到 notifications）
+CREATE TABLE IF NOT EXISTS notification_outbox (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  payload TEXT NOT NULL,                  -- 通知内容（JSON）
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 用户未读通知计数（创建/已读/删除通知时增量维护，后台任务定期校准）
+CREATE TABLE IF NOT EXISTS notification_counters (
+  user_id INT PRIMARY KEY,
+  unread_count INT NOT NULL DEFAULT 0,
+  CONSTRAINT fk_notification_counters_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 下单接口幂等键（Idempotency-Key 请求头），重复请求直接重放保存的响应
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  key_hash CHAR(64) PRIMARY KEY,          -- sha256(接口 + 调用者 + 幂等键)
+  request_hash CHAR(64) NOT NULL,         -- 请求体哈希，同一个键用于不同请求时拒绝
+  status_code INT DEFAULT NULL,           -- 为空表示请求仍在处理
+  response_body MEDIUMTEXT,
+  mimetype VARCHAR(100) DEFAULT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  expires_at DATETIME NOT NULL,
+  INDEX idx_expires_at (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 按天的店铺销售汇总（下单及订单状态变更时增量维护），user_id 为下单用户，匿名订单记为 0
+CREATE TABLE IF NOT EXISTS shop_daily_sales (
+  shop_id INT NOT NULL,
+  sale_date DATE NOT NULL,
+  status VARCHAR(50) NOT NULL,
+  user_id INT NOT NULL DEFAULT 0,
+  order_count INT NOT NULL DEFAULT 0,
+  revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (shop_id, sale_date, status, user_id),
+  INDEX idx_user_status (user_id, status)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 按天的菜品销售汇总
+CREATE TABLE IF NOT EXISTS dish_daily_sales (
+  dish_id INT NOT NULL,
+  sale_date DATE NOT NULL,
+  status VARCHAR(50) NOT NULL,
+  user_id INT NOT NULL DEFAULT 0,
+  shop_id INT NOT NULL DEFAULT 1,
+  quantity INT NOT NULL DEFAULT 0,
+  revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (dish_id, sale_date, status, user_id),
+  INDEX idx_user_status (user_id, status, dish_id),
+  INDEX idx_shop_date (shop_id, sale_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 按小时的店铺销售汇总（/api/sales/timeseries 按小时分桶，过期数据由后台任务清理）
+CREATE TABLE IF NOT EXISTS shop_hourly_sales (
+  shop_id INT NOT NULL,
+  sale_hour DATETIME NOT NULL,
+  status VARCHAR(50) NOT NULL,
+  order_count INT NOT NULL DEFAULT 0,
+  revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (shop_id, sale_hour, status),
+  INDEX idx_sale_hour (sale_hour)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 按小时的菜品销售汇总
+CREATE TABLE IF NOT EXISTS dish_hourly_sales (
+  dish_id INT NOT NULL,
+  sale_hour DATETIME NOT NULL,
+  status VARCHAR(50) NOT NULL,
+  shop_id INT NOT NULL DEFAULT 1,
+  quantity INT NOT NULL DEFAULT 0,
+  revenue DECIMAL(12,2) NOT NULL DEFAULT 0.00,
+  PRIMARY KEY (dish_id, sale_hour, status),
+  INDEX idx_shop_hour (shop_id, sale_hour),
+  INDEX idx_sale_hour (sale_hour)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
\ No newline at end of file
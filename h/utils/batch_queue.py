@@ -0,0 +1,90 @@
+import atexit
+import queue
+import threading
+
+
+class BatchQueue:
+    """有界内存队列 + 工作线程：调用方只负责入队，工作线程攒批后交给 handler 处理
+
+    队列已满或工作线程未启动时 submit 返回 False，由调用方决定同步兜底。
+    进程正常退出时把队列中剩余的任务处理完。
+    """
+
+    def __init__(self, name, handler, maxsize=1000, workers=2, batch_size=100):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._logger = None
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self, logger=None):
+        if self._threads:
+            return
+        self._logger = logger
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        atexit.register(self.drain)
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def is_full(self):
+        return self._queue.full()
+
+    def submit(self, item):
+        if not self._threads:
+            return False
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.rejected += 1
+            return False
+
+    def drain(self):
+        """在当前线程处理完队列中剩余的任务"""
+        while True:
+            batch = self._take_batch(block=False)
+            if not batch:
+                return
+            self._handle(batch)
+
+    def _take_batch(self, block=True):
+        batch = []
+        try:
+            batch.append(self._queue.get(block=block))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _handle(self, batch):
+        try:
+            self.handler(batch)
+            self.processed += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            if self._logger:
+                self._logger.error(f'{self.name} 批量处理失败（{len(batch)} 条）: {e}')
+
+    def _loop(self):
+        while True:
+            self._handle(self._take_batch())
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'workers': len(self._threads),
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,73 @@
+import hashlib
+import threading
+import time
+import uuid
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+# 进程内资源版本号：写操作提交后递增，读接口据此生成 ETag，命中时无需查库
+_versions = {}
+_versions_lock = threading.Lock()
+# 进程标识：重启或多进程部署时不同进程的版本号互不混淆
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def bump_version(*resources):
+    """资源发生变更，使其版本 ETag 失效"""
+    with _versions_lock:
+        for resource in resources:
+            _versions[resource] = _versions.get(resource, 0) + 1
+
+
+def get_version(resource):
+    with _versions_lock:
+        return _versions.get(resource, 0)
+
+
+def _version_etag(resource, variant):
+    # 其他进程的写操作不会递增本进程版本号，按 HTTP_ETAG_VERSION_TTL 分段使版本 ETag 自然过期
+    ttl = max(1, int(current_app.config.get('HTTP_ETAG_VERSION_TTL', 30)))
+    bucket = int(time.time() // ttl)
+    raw = f'{resource}|{variant}|{get_version(resource)}|{_BOOT_ID}|{bucket}'
+    return 'v-' + hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _not_modified(etag, cache_control):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def conditional_get(resource=None, cache_control='no-cache', vary=None):
+    """GET 接口的条件请求（ETag / If-None-Match）
+
+    resource 为版本资源名时，ETag 由版本号生成，If-None-Match 命中直接返回 304，不执行视图；
+    否则执行视图后按响应体内容哈希生成 ETag。仅对成功响应（statusCode 200）打标签。
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            etag = None
+            if resource:
+                etag = _version_etag(resource, request.query_string.decode('utf-8', 'ignore'))
+                if etag in request.if_none_match:
+                    return _not_modified(etag, cache_control)
+
+            rv = fn(*args, **kwargs)
+            if isinstance(rv, dict) and rv.get('statusCode', 200) != 200:
+                return rv
+
+            response = make_response(rv)
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            if etag is None:
+                etag = hashlib.md5(response.get_data()).hexdigest()
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            if vary:
+                response.vary.add(vary)
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
@@ -0,0 +1,168 @@
+import hashlib
+from functools import wraps
+
+import pymysql
+from flask import current_app, g, make_response, request
+
+from config import config
+from models.database import call_after_commit, get_db_connection, is_server_error
+from utils.cache import TTLCache
+from utils.jwt_utils import decode_token
+from utils.response_utils import error_response
+
+# 已完成请求的响应：key_hash -> (request_hash, status_code, body, mimetype)
+_responses = TTLCache(ttl=config['default'].IDEMPOTENCY_KEY_TTL, maxsize=10000)
+
+
+class _KeyInProgress(Exception):
+    """同一个幂等键的请求仍在处理中"""
+
+
+def _caller_scope():
+    """调用者标识：按 token 中的 uid 而不是 token 本身，重试前刷新了 token 仍是同一个调用者"""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        try:
+            uid = decode_token(auth_header[7:].strip()).get('uid')
+        except Exception:
+            uid = None
+        if uid:
+            return f'uid:{uid}'
+    return 'anonymous'
+
+
+def _key_hash(key):
+    # 幂等键按接口和调用者隔离，不同用户使用相同的键互不影响
+    raw = f"{request.method}|{request.path}|{_caller_scope()}|{key}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _replay(stored):
+    _, status_code, body, mimetype = stored
+    response = current_app.response_class(body, status=status_code, mimetype=mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _load(cursor, key_hash):
+    cursor.execute("""
+        SELECT request_hash, status_code, response_body, mimetype, expires_at < NOW() AS expired
+        FROM idempotency_keys WHERE key_hash = %s
+    """, (key_hash,))
+    return cursor.fetchone()
+
+
+def _claim(key_hash, request_hash):
+    """占用幂等键，返回 None 表示占用成功，否则返回已保存的响应
+
+    请求级会话中占用记录与业务写入在同一个事务里：并发的重复请求会在主键上等待，
+    前一个请求提交后读到它的响应；前一个请求失败回滚则由重复请求接着执行。
+    """
+    ttl = config['default'].IDEMPOTENCY_KEY_TTL
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            for _ in range(2):
+                try:
+                    cursor.execute("""
+                        INSERT INTO idempotency_keys (key_hash, request_hash, expires_at)
+                        VALUES (%s, %s, NOW() + INTERVAL %s SECOND)
+                    """, (key_hash, request_hash, ttl))
+                    connection.commit()
+                    return None
+                except pymysql.err.IntegrityError:
+                    row = _load(cursor, key_hash)
+                    if row is None:
+                        continue
+                    if row['expired']:
+                        cursor.execute("DELETE FROM idempotency_keys WHERE key_hash = %s", (key_hash,))
+                        continue
+                    if row['status_code'] is None:
+                        raise _KeyInProgress()
+                    return (row['request_hash'], row['status_code'], row['response_body'], row['mimetype'])
+            raise _KeyInProgress()
+    finally:
+        connection.close()
+
+
+def _complete(key_hash, stored):
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE idempotency_keys SET status_code = %s, response_body = %s, mimetype = %s
+                WHERE key_hash = %s
+            """, (stored[1], stored[2], stored[3], key_hash))
+            connection.commit()
+    finally:
+        connection.close()
+    call_after_commit(lambda: _responses.set(key_hash, stored))
+
+
+def _release(key_hash):
+    """请求失败时释放幂等键，允许客户端重试（请求级会话中随事务回滚自动释放）"""
+    if g.get('_db_session_enabled'):
+        return
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM idempotency_keys WHERE key_hash = %s", (key_hash,))
+            connection.commit()
+    finally:
+        connection.close()
+
+
+def idempotent(fn):
+    """支持 Idempotency-Key 请求头的写接口
+
+    同一个键的重复请求直接重放第一次的响应，不再执行事务；键保留 IDEMPOTENCY_KEY_TTL 秒。
+    同一个键用于不同的请求体返回 422，第一次请求仍在处理中返回 409。
+    服务端错误和 429 的响应不保存，客户端可以用同一个键重试。
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key', '').strip()
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > 255:
+            return error_response("Idempotency-Key 过长", 400)
+
+        key_hash = _key_hash(key)
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+        stored = _responses.get(key_hash)
+        if stored is None:
+            try:
+                stored = _claim(key_hash, request_hash)
+            except _KeyInProgress:
+                response = make_response(error_response("相同的请求正在处理中，请稍后重试", 409), 409)
+                response.headers['Retry-After'] = '1'
+                return response
+        if stored is not None:
+            if stored[0] != request_hash:
+                return make_response(error_response("Idempotency-Key 已用于不同的请求", 422), 422)
+            return _replay(stored)
+
+        try:
+            response = make_response(fn(*args, **kwargs))
+        except Exception:
+            _release(key_hash)
+            raise
+        # 服务端错误和限流（429）都可以用同一个键重试，不保存
+        if is_server_error(response) or response.status_code == 429 or response.is_streamed:
+            _release(key_hash)
+            return response
+        _complete(key_hash, (request_hash, response.status_code, response.get_data(as_text=True), response.mimetype))
+        return response
+    return wrapper
+
+
+def purge_expired_keys():
+    """删除过期的幂等键（后台任务）"""
+    connection = get_db_connection(scoped=False)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM idempotency_keys WHERE expires_at < NOW() LIMIT 10000")
+            connection.commit()
+    finally:
+        connection.close()
@@ -0,0 +1,20 @@
+import base64
+import json
+
+
+def encode_cursor(*values):
+    """把排序键编码为不透明的游标字符串"""
+    raw = json.dumps(list(values), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    """解析游标，格式不对时抛出 ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('无效的游标')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('无效的游标')
+    return values
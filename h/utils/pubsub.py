@@ -0,0 +1,231 @@
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from config import config
+
+# 事件 id 前缀：多进程部署时各进程生成的 id 互不冲突
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+
+class Subscription:
+    """单个连接的有界事件缓冲区，消费跟不上时丢弃最旧的事件并标记 overflowed"""
+
+    def __init__(self, hub, channel, maxsize):
+        self._hub = hub
+        self.channel = channel
+        self._events = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self.overflowed = False
+        self.closed = False
+
+    def push(self, event):
+        with self._cond:
+            if len(self._events) == self._events.maxlen:
+                self.overflowed = True
+            self._events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout):
+        """等待并取出缓冲区中的全部事件，超时返回空列表"""
+        with self._cond:
+            if not self._events and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+        self._hub.unsubscribe(self)
+
+
+class _ChannelHistory:
+    """频道的回放窗口：(本进程投递序号, 事件)，dropped_seq 为已滚出窗口的最大序号"""
+
+    def __init__(self, maxlen, dropped_seq=0):
+        self.events = deque(maxlen=maxlen)
+        self.dropped_seq = dropped_seq
+
+    def append(self, seq, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped_seq = self.events[0][0]
+        self.events.append((seq, event))
+
+
+class LocalBroker:
+    """进程内 broker：发布即投递给本进程的订阅者"""
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, channel, event):
+        self._deliver(channel, event)
+
+
+class RedisBroker:
+    """基于 Redis pub/sub 的 broker，多个工作进程的事件互相转发
+
+    redis 为可选依赖，仅在 PUBSUB_BROKER=redis 时需要安装。
+    """
+
+    PREFIX = 'harmony:events:'
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def start(self, deliver):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(self.PREFIX + '*')
+
+        def listen():
+            for message in pubsub.listen():
+                try:
+                    channel = message['channel'].decode('utf-8')[len(self.PREFIX):]
+                    deliver(channel, json.loads(message['data']))
+                except Exception:
+                    continue
+
+        threading.Thread(target=listen, name='pubsub-redis', daemon=True).start()
+
+    def publish(self, channel, event):
+        self._client.publish(self.PREFIX + channel, json.dumps(event, ensure_ascii=False, default=str))
+
+
+class PubSubHub:
+    """按频道分发事件的进程内中心
+
+    每个频道保留最近 replay_size 条事件，断线重连时按 Last-Event-ID 补发；
+    跨进程分发交给可替换的 broker。
+    频道还没有事件时 last_event_id 返回 "{BOOT}@{序号}" 形式的起点游标，
+    表示"本进程该序号之后投递的全部事件"，空频道也不会丢失两次轮询之间的事件。
+    """
+
+    def __init__(self, broker=None, replay_size=100, queue_size=256, max_channels=10000):
+        self.replay_size = replay_size
+        self.queue_size = queue_size
+        self.max_channels = max_channels
+        self._lock = threading.Lock()
+        self._subscribers = {}          # channel -> set(Subscription)
+        self._history = OrderedDict()   # channel -> _ChannelHistory，按最近活跃排序
+        self._counter = itertools.count(1)
+        self._seq = 0                   # 本进程投递序号（含其他进程经 broker 转发的事件）
+        self._evicted_seq = 0           # 因频道数超限被整体淘汰的历史中的最大序号
+        self._broker = broker or LocalBroker()
+        self._broker.start(self._deliver)
+        self.published = 0
+        self.delivered = 0
+
+    def publish(self, channel, event_type, data):
+        """发布事件，返回事件 id"""
+        event = {
+            'id': f'{_BOOT_ID}-{next(self._counter)}',
+            'event': event_type,
+            'data': data,
+            'time': int(time.time()),
+        }
+        self.published += 1
+        self._broker.publish(channel, event)
+        return event['id']
+
+    def subscribe(self, channel, last_event_id=None):
+        """订阅频道；返回 (subscription, 需要补发的事件, 是否无法续传)"""
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+            history = self._history.get(channel)
+            entries = list(history.events) if history else []
+            dropped_seq = history.dropped_seq if history else self._evicted_seq
+
+        if not last_event_id:
+            return subscription, [], False
+        origin = self._parse_origin(last_event_id)
+        if origin is not None:
+            if dropped_seq > origin:
+                return subscription, [], True
+            return subscription, [event for seq, event in entries if seq > origin], False
+        ids = [event['id'] for _, event in entries]
+        if last_event_id in ids:
+            return subscription, [event for _, event in entries[ids.index(last_event_id) + 1:]], False
+        # 事件已滚出回放窗口，客户端需要重新拉取一次全量数据
+        return subscription, [], True
+
+    def last_event_id(self, channel):
+        """频道最新一条事件的 id；还没有事件时返回起点游标，用作长轮询的初始游标"""
+        with self._lock:
+            history = self._history.get(channel)
+            if history and history.events:
+                return history.events[-1][1]['id']
+            return f'{_BOOT_ID}@{self._seq}'
+
+    @staticmethod
+    def _parse_origin(cursor):
+        """本进程签发的起点游标返回其序号，其他游标返回 None"""
+        boot_id, sep, seq = cursor.partition('@')
+        if sep and boot_id == _BOOT_ID and seq.isdigit():
+            return int(seq)
+        return None
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            self._seq += 1
+            history = self._history.get(channel)
+            if history is None:
+                history = self._history[channel] = _ChannelHistory(self.replay_size, self._evicted_seq)
+                while len(self._history) > self.max_channels:
+                    _, evicted = self._history.popitem(last=False)
+                    if evicted.events:
+                        self._evicted_seq = max(self._evicted_seq, evicted.events[-1][0])
+            else:
+                self._history.move_to_end(channel)
+            history.append(self._seq, event)
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+            self.delivered += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'channels': len(self._history),
+                'subscribers': sum(len(s) for s in self._subscribers.values()),
+                'published': self.published,
+                'delivered': self.delivered,
+            }
+
+
+def _create_hub():
+    hub_config = config['default']
+    broker = None
+    if hub_config.PUBSUB_BROKER == 'redis':
+        broker = RedisBroker(hub_config.PUBSUB_REDIS_URL)
+    return PubSubHub(
+        broker=broker,
+        replay_size=hub_config.PUBSUB_REPLAY_SIZE,
+        queue_size=hub_config.PUBSUB_QUEUE_SIZE,
+    )
+
+
+hub = _create_hub()
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def shop_orders_channel(shop_id):
+    return f'shop:{shop_id}:orders'
@@ -0,0 +1,123 @@
+import os
+import threading
+
+
+class PeriodicJob:
+    """按固定间隔在守护线程中执行的后台任务"""
+
+    def __init__(self, name, func, interval, initial_delay=None, lock=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.initial_delay = interval if initial_delay is None else initial_delay
+        self.lock = lock
+        self.last_error = None
+        self.run_count = 0
+        self.skip_count = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, logger=None):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._loop, args=(logger,), name=f'job-{self.name}', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self, logger=None):
+        if self.lock is None:
+            self._run(logger)
+            return
+        try:
+            with self.lock(self.name) as acquired:
+                if acquired:
+                    self._run(logger)
+                else:
+                    # 其他进程正在执行同名任务，跳过本轮
+                    self.skip_count += 1
+        except Exception as e:
+            self.last_error = str(e)
+            if logger:
+                logger.error(f'后台任务 {self.name} 获取互斥锁失败: {e}')
+
+    def _run(self, logger):
+        try:
+            self.func()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            if logger:
+                logger.error(f'后台任务 {self.name} 执行失败: {e}')
+        finally:
+            self.run_count += 1
+
+    def _loop(self, logger):
+        if self._stop.wait(self.initial_delay):
+            return
+        while True:
+            self.run_once(logger)
+            if self._stop.wait(self.interval):
+                return
+
+
+class JobScheduler:
+    """后台任务注册表：create_app 中注册任务，启动时统一拉起线程"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._started = False
+        self._logger = None
+
+    def add_job(self, name, func, interval, initial_delay=None, lock=None):
+        """注册任务；同名任务只保留第一次注册
+
+        lock: 跨进程互斥的上下文管理器工厂 lock(name)，yield 是否拿到锁，
+        用于全表扫描类任务在多 worker 部署时只由一个进程执行。
+        """
+        if interval <= 0 or name in self._jobs:
+            return self._jobs.get(name)
+        job = PeriodicJob(name, func, interval, initial_delay, lock)
+        self._jobs[name] = job
+        if self._started:
+            job.start(self._logger)
+        return job
+
+    def start(self, app):
+        """启动所有已注册任务"""
+        if self._started or not should_run_jobs(app):
+            return
+        self._started = True
+        self._logger = app.logger
+        for job in self._jobs.values():
+            job.start(self._logger)
+
+    def stop(self):
+        for job in self._jobs.values():
+            job.stop()
+
+    def stats(self):
+        return {
+            name: {
+                'interval': job.interval,
+                'run_count': job.run_count,
+                'skip_count': job.skip_count,
+                'last_error': job.last_error,
+            }
+            for name, job in self._jobs.items()
+        }
+
+
+def should_run_jobs(app):
+    """调试模式下 Werkzeug reloader 会启动两个进程，只在实际服务的子进程中运行任务"""
+    if not app.config.get('BACKGROUND_JOBS_ENABLED', True):
+        return False
+    if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return False
+    return True
+
+
+scheduler = JobScheduler()
@@ -0,0 +1,50 @@
+import json
+import time
+
+from flask import current_app
+
+
+def format_sse(data, event=None, event_id=None):
+    """按 text/event-stream 格式编码一条事件"""
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    lines.extend(f'data: {line}' for line in payload.splitlines())
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_subscription(subscription, backlog=(), reset=False, heartbeat=15, max_duration=300):
+    """把订阅转成 SSE 响应
+
+    - 先补发断线期间的事件；无法续传或缓冲区溢出时发送 reset，客户端应重新拉取一次全量数据
+    - 空闲时按 heartbeat 秒发送注释行保活
+    - 连接最长保持 max_duration 秒后结束，客户端带 Last-Event-ID 自动重连，避免长期占用工作线程
+    """
+    def generate():
+        deadline = time.monotonic() + max_duration
+        try:
+            yield 'retry: 3000\n\n'
+            if reset:
+                yield format_sse({}, event='reset')
+            for event in backlog:
+                yield format_sse(event['data'], event=event['event'], event_id=event['id'])
+            while time.monotonic() < deadline:
+                events = subscription.get(heartbeat)
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield format_sse({}, event='reset')
+                if not events:
+                    yield ': ping\n\n'
+                    continue
+                for event in events:
+                    yield format_sse(event['data'], event=event['event'], event_id=event['id'])
+        finally:
+            subscription.close()
+
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # 关闭 Nginx 缓冲，事件即时下发
+    return response